@@ -1,13 +1,14 @@
 """
 MVP Dashboard API - Focused on Single Farm Pond Monitoring
 """
+import json
 from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Depends, Query
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.database.connection import get_database
-from app.utils.mongo_serializer import serialize_mongo_documents
-from app.websocket.manager import websocket_manager
+from app.websocket.manager import websocket_manager, FORMAT_JSON, FORMAT_MSGPACK
+from app.utils.mongo_serializer import ORJSONResponse
 
 # Helper functions for chart data formatting
 def get_parameter_unit(parameter: str) -> str:
@@ -110,12 +111,36 @@ router = APIRouter(prefix="/mvp", tags=["MVP Dashboard"])
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint for real-time pond monitoring"""
-    await websocket_manager.connect(websocket, {"connected_at": datetime.utcnow()})
+    # ?format=msgpack switches this client to MessagePack binary frames
+    fmt = FORMAT_MSGPACK if websocket.query_params.get("format") == FORMAT_MSGPACK else FORMAT_JSON
+    await websocket_manager.connect(websocket, {"connected_at": datetime.utcnow(), "format": fmt})
+    # ?ponds=pond_001,pond_002 limits pond updates to those ponds from the start
+    for pond_id in filter(None, websocket.query_params.get("ponds", "").split(",")):
+        websocket_manager.subscribe(websocket, pond_id)
     try:
         while True:
             # Keep connection alive and listen for messages
             data = await websocket.receive_text()
+            websocket_manager.touch(websocket)
             logger.info(f"Received WebSocket message: {data}")
+
+            try:
+                command = json.loads(data)
+            except ValueError:
+                command = None
+            if isinstance(command, dict) and command.get("type") in ("subscribe", "unsubscribe") and command.get("pond_id"):
+                if command["type"] == "subscribe":
+                    websocket_manager.subscribe(websocket, command["pond_id"])
+                else:
+                    websocket_manager.unsubscribe(websocket, command["pond_id"])
+                await websocket_manager.send_personal_message(
+                    {"type": command["type"] + "d", "pond_id": command["pond_id"]},
+                    websocket
+                )
+                continue
+            if isinstance(command, dict) and command.get("type") == "pong":
+                # Answer to the server's keep-alive ping; touching the connection was enough
+                continue
             
             # Echo back or handle specific commands
             await websocket_manager.send_personal_message(
@@ -123,6 +148,9 @@ async def websocket_endpoint(websocket: WebSocket):
                 websocket
             )
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Any exit path, not only a clean disconnect, must release the connection
         websocket_manager.disconnect(websocket)
 
 
@@ -279,20 +307,21 @@ async def get_active_alerts(
         
         alerts = await cursor.to_list(length=100)
 
-        # Use the serializer to properly handle ObjectIds and datetimes
-        formatted_alerts = serialize_mongo_documents(alerts)
-
-        # Group by severity
+        # ObjectIds and datetimes are encoded by ORJSONResponse's default hook;
+        # only the "_id" key is renamed for the frontend
         by_severity = {"critical": 0, "high": 0, "medium": 0, "low": 0}
-        for alert in formatted_alerts:
+        for alert in alerts:
+            alert["id"] = alert.pop("_id")
             severity = alert.get("severity", "low")
             by_severity[severity] = by_severity.get(severity, 0) + 1
 
-        return {
-            "total_active_alerts": len(formatted_alerts),
-            "alerts": formatted_alerts,
+        # Returned as a response object so FastAPI's jsonable_encoder, which
+        # cannot handle ObjectId, never sees the raw documents
+        return ORJSONResponse({
+            "total_active_alerts": len(alerts),
+            "alerts": alerts,
             "by_severity": by_severity
-        }
+        })
 
     except Exception as e:
         logger.error(f"Error getting active alerts: {e}", exc_info=True)
@@ -42,7 +42,7 @@ async def get_user_by_username(db, username: str):
     """Get user by username from database"""
     user_data = await db.users.find_one({"username": username})
     if user_data:
-        return User(**user_data)
+        return User.model_construct(**user_data)
     return None
 
 
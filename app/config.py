@@ -10,6 +10,11 @@ class Settings(BaseSettings):
     # Database
     mongodb_url: str = "mongodb://localhost:27017"
     database_name: str = "pond_monitoring"
+    mongodb_max_pool_size: int = 10
+    mongodb_min_pool_size: int = 2
+    mongodb_compressors: str = "zstd,snappy,zlib"
+    mongodb_socket_timeout_ms: int = 2000
+    mongodb_server_selection_timeout_ms: int = 3000
     
     # JWT
     secret_key: str = "your-secret-key-here-change-this-in-production"
@@ -31,6 +36,19 @@ class Settings(BaseSettings):
     # Logging
     log_level: str = "INFO"
     
+    # WebSocket
+    websocket_max_connections: int = 1000
+    # Protocol-level pings sent by uvicorn (browsers answer them automatically)
+    websocket_ping_interval: float = 15.0
+    websocket_ping_timeout: float = 20.0
+    # Opt-in app-level reaper: closes clients silent for this long, pinging with
+    # {"type": "ping"} every ping interval; 0 disables
+    websocket_idle_timeout: float = 0.0
+    # permessage-deflate negotiated by uvicorn; costs a compression context per client
+    websocket_per_message_deflate: bool = True
+    # Redis pub/sub backplane for running several workers; empty keeps broadcasts local
+    redis_url: str = ""
+    
     # Twilio SMS
     twilio_account_sid: str = ""
     twilio_auth_token: str = ""
@@ -3,6 +3,13 @@ from app.config import get_settings
 
 settings = get_settings()
 
+# sensor_readings is an append-only per-pond stream, stored as a time-series collection
+SENSOR_READINGS_TIMESERIES = {
+    "timeField": "timestamp",
+    "metaField": "pond_id",
+    "granularity": "seconds"
+}
+
 
 class MongoDB:
     client: AsyncIOMotorClient = None
@@ -26,6 +33,20 @@ async def close_mongo_connection():
         print("Disconnected from MongoDB")
 
 
+async def ensure_indexes():
+    """Create the compound indexes backing the alert and reading queries"""
+    db = mongodb.database
+    # Active alerts and per-pond dedupe window
+    await db.alerts.create_index([("pond_id", 1), ("is_resolved", 1), ("created_at", -1)])
+    # Exact duplicate-alert lookup
+    await db.alerts.create_index([
+        ("pond_id", 1), ("parameter", 1), ("alert_type", 1), ("is_resolved", 1), ("created_at", -1)
+    ])
+    # Latest/ranged readings per pond
+    await db.sensor_readings.create_index([("pond_id", 1), ("timestamp", -1)])
+    print("MongoDB indexes ensured")
+
+
 def get_database():
     """Get database instance"""
     return mongodb.database
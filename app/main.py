@@ -6,9 +6,11 @@ from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from app.config import get_settings
-from app.database.connection import connect_to_mongo, close_mongo_connection
+from app.database.connection import connect_to_mongo, close_mongo_connection, ensure_indexes
 from app.api import auth, users, farms, ponds, sensor_readings, alerts, ml, dashboard, mvp_dashboard
 from app.mqtt.simple_client import simple_mqtt_handler
+from app.utils.mongo_serializer import ORJSONResponse
+from app.websocket.manager import websocket_manager
 
 # Configure logging
 logging.basicConfig(
@@ -38,8 +40,16 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("🌊 Starting Pond Monitoring System MVP...")
     await connect_to_mongo()
+    await ensure_indexes()
     logger.info("✅ Database connected")
     
+    # Cross-worker WebSocket fan-out; a no-op unless REDIS_URL is set
+    await websocket_manager.start_backplane()
+    websocket_manager.start_reaper()
+    
+    # SMS workers live on this loop; the MQTT thread hands alerts to them
+    await simple_mqtt_handler.start_notifications()
+    
     # Start MQTT client in background thread
     mqtt_thread = threading.Thread(target=start_mqtt_background, daemon=True)
     mqtt_thread.start()
@@ -50,6 +60,9 @@ async def lifespan(app: FastAPI):
     # Shutdown
     logger.info("🛑 Shutting down Pond Monitoring System...")
     simple_mqtt_handler.stop()
+    await simple_mqtt_handler.stop_notifications()
+    await websocket_manager.stop_reaper()
+    await websocket_manager.stop_backplane()
     await close_mongo_connection()
     logger.info("✅ Shutdown complete")
 
@@ -59,7 +72,8 @@ app = FastAPI(
     title="Pond Monitoring System MVP",
     description="Real-time pond monitoring with WebSocket, alerts, and SMS notifications",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware - Explicit configuration for better browser compatibility
@@ -203,7 +217,8 @@ async def services_status():
             "broker": f"{settings.mqtt_broker_host}:{settings.mqtt_broker_port}"
         },
         "websocket": {
-            "active_connections": websocket_manager.get_connection_count()
+            "active_connections": websocket_manager.get_connection_count(),
+            "evicted_connections": websocket_manager.evicted_connections
         },
         "sms_service": {
             "status": "enabled" if sms_service.is_enabled() else "disabled"
@@ -219,5 +234,11 @@ if __name__ == "__main__":
         host=settings.api_host,
         port=settings.api_port,
         reload=settings.debug,
-        log_level="info"
+        log_level="info",
+        # "auto" runs on uvloop and httptools when uvicorn[standard] is installed
+        loop="auto",
+        ws_per_message_deflate=settings.websocket_per_message_deflate,
+        # Dead connections are detected with protocol pings, which clients answer automatically
+        ws_ping_interval=settings.websocket_ping_interval,
+        ws_ping_timeout=settings.websocket_ping_timeout
     )
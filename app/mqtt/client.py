@@ -3,6 +3,7 @@ import json
 import logging
 from datetime import datetime
 from typing import Dict, Any
+import msgpack
 import paho.mqtt.client as mqtt
 import pymongo
 from bson import ObjectId
@@ -15,6 +16,9 @@ from app.websocket.manager import websocket_manager
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# First bytes of a JSON document; MessagePack maps never start with these
+JSON_PAYLOAD_PREFIXES = frozenset(b'{[ \t\r\n')
+
 
 class MQTTHandler:
     def __init__(self):
@@ -77,10 +81,13 @@ class MQTTHandler:
     def on_message(self, client, userdata, msg):
         """Callback for when a PUBLISH message is received from the server"""
         try:
-            # Parse the JSON payload
-            payload_str = msg.payload.decode('utf-8')
-            logger.info(f"Raw payload from {msg.topic}: '{payload_str}'")
-            payload = json.loads(payload_str)
+            # Simulators may publish MessagePack; anything that looks like JSON is parsed as JSON
+            if msg.payload and msg.payload[0] not in JSON_PAYLOAD_PREFIXES:
+                payload = msgpack.unpackb(msg.payload, raw=False)
+            else:
+                payload_str = msg.payload.decode('utf-8')
+                logger.info(f"Raw payload from {msg.topic}: '{payload_str}'")
+                payload = json.loads(payload_str)
 
             
             logger.info(f"Received message from {msg.topic}: {payload}")
@@ -100,6 +107,8 @@ class MQTTHandler:
             
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse JSON payload: {e}")
+        except (msgpack.UnpackException, ValueError) as e:
+            logger.error(f"Failed to parse MQTT payload: {e}")
         except Exception as e:
             logger.error(f"Error processing MQTT message: {e}")
     
@@ -425,20 +434,12 @@ class MQTTHandler:
                 logger.warning(f"Validation errors for pond {pond_id}: {validation_errors}")
 
             # Create sensor reading
-            reading_data = SensorReadingCreate(
-                pond_id=pond_id,
-                timestamp=timestamp,
-                temperature=sensor_values['temperature'],
-                ph=sensor_values['ph'],
-                dissolved_oxygen=sensor_values['dissolved_oxygen'],
-                turbidity=sensor_values['turbidity'],
-                ammonia=sensor_values['ammonia'],
-                nitrite=sensor_values['nitrite'],
-                nitrate=sensor_values['nitrate'],
-                salinity=sensor_values['salinity'],
-                water_level=sensor_values['water_level'],
-                device_id=data.get('device_id')
-            )
+            reading_data = SensorReadingCreate.model_validate({
+                **sensor_values,
+                'pond_id': pond_id,
+                'timestamp': timestamp,
+                'device_id': data.get('device_id')
+            })
 
             # Store the reading
             reading = await self.sensor_service.create_reading(reading_data)
@@ -648,6 +649,11 @@ class MQTTHandler:
         if self.client:
             self.client.loop_forever()
 
+    def start_background(self):
+        """Start paho's own network thread without blocking the caller"""
+        if self.client:
+            self.client.loop_start()
+
     def stop(self):
         """Stop the MQTT client"""
         if self.client:
@@ -2,18 +2,45 @@
 Simple MQTT Client for MVP - Real-time Pond Monitoring
 """
 import asyncio
-import json
 import logging
+import socket
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, List
+import msgpack
+import orjson
 import paho.mqtt.client as mqtt
 import pymongo
+from pymongo import UpdateOne, WriteConcern
 from app.config import get_settings
+from app.database.connection import SENSOR_READINGS_TIMESERIES
 from app.websocket.manager import websocket_manager
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# First bytes of a JSON document; MessagePack maps never start with these
+JSON_PAYLOAD_PREFIXES = frozenset(b'{[ \t\r\n')
+
+# Parameters checked against thresholds, in evaluation order
+THRESHOLD_PARAMETERS = (
+    'ph', 'temperature', 'dissolved_oxygen', 'turbidity', 'nitrate', 'ammonia', 'water_level'
+)
+
+# Window during which a repeated violation of the same parameter is not re-alerted
+ALERT_DEDUPE_WINDOW = timedelta(minutes=15)
+
+# SMS fan-out: bounded queue drained by a few workers that batch status updates
+SMS_QUEUE_SIZE = 1000
+SMS_WORKERS = 4
+SMS_BATCH_SIZE = 16
+SMS_BATCH_WAIT = 0.5  # seconds to wait for more alerts before sending a batch
+
+# Paho flow control: let the client drain bursts instead of throttling them
+MQTT_MAX_INFLIGHT = 1000
+MQTT_MAX_QUEUED = 0  # unlimited
+MQTT_RECONNECT_MIN_DELAY = 1
+MQTT_RECONNECT_MAX_DELAY = 30
+
 
 class SimpleMQTTHandler:
     def __init__(self):
@@ -22,19 +49,106 @@ class SimpleMQTTHandler:
         # Synchronous MongoDB connection for MQTT processing
         self.sync_mongo_client = None
         self.sync_db = None
+        self.readings_collection = None
+        # Last alert time per (pond_id, parameter), used to skip the dedupe query
+        self._recent_alerts: Dict[tuple, datetime] = {}
+        # Threshold table built once instead of per reading
+        self._thresholds = self._build_thresholds()
+        # SMS notifications run on the application event loop
+        self._loop = None
+        self._sms_queue = None
+        self._sms_workers = []
+
+    async def start_notifications(self):
+        """Start the SMS workers on the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._sms_queue = asyncio.Queue(maxsize=SMS_QUEUE_SIZE)
+        self._sms_workers = [asyncio.create_task(self._sms_worker()) for _ in range(SMS_WORKERS)]
+        logger.info(f"Started {SMS_WORKERS} SMS notification workers")
+
+    async def stop_notifications(self):
+        """Cancel the SMS workers"""
+        for worker in self._sms_workers:
+            worker.cancel()
+        await asyncio.gather(*self._sms_workers, return_exceptions=True)
+        self._sms_workers = []
+        self._loop = None
 
     def initialize(self):
         """Initialize database connection"""
         try:
-            self.sync_mongo_client = pymongo.MongoClient(settings.mongodb_url)
+            self.sync_mongo_client = pymongo.MongoClient(
+                settings.mongodb_url,
+                maxPoolSize=settings.mongodb_max_pool_size,
+                minPoolSize=settings.mongodb_min_pool_size,
+                compressors=settings.mongodb_compressors,
+                socketTimeoutMS=settings.mongodb_socket_timeout_ms,
+                serverSelectionTimeoutMS=settings.mongodb_server_selection_timeout_ms,
+                retryWrites=True
+            )
             self.sync_db = self.sync_mongo_client[settings.database_name]
+            self._ensure_timeseries_collection()
+            # Readings are telemetry and get client-side ids, so they are written
+            # unacknowledged; alerts keep w=1 because dedupe relies on upserted ids
+            self.readings_collection = self.sync_db.get_collection(
+                "sensor_readings", write_concern=WriteConcern(w=0)
+            )
+            self._ensure_indexes()
+            self._prime_recent_alerts()
             logger.info("Simple MQTT Handler initialized")
         except Exception as e:
             logger.error(f"Failed to initialize MongoDB connection: {e}")
 
+    def _ensure_timeseries_collection(self):
+        """Create sensor_readings as a time-series collection if it does not exist yet"""
+        try:
+            self.sync_db.create_collection("sensor_readings", timeseries=SENSOR_READINGS_TIMESERIES)
+            logger.info("Created time-series collection sensor_readings")
+        except pymongo.errors.CollectionInvalid:
+            info = next(self.sync_db.list_collections(filter={"name": "sensor_readings"}), None)
+            if info and info.get("type") != "timeseries":
+                logger.warning("sensor_readings is not a time-series collection; run scripts/migrate.py to convert it")
+        except Exception as e:
+            logger.error(f"Failed to create sensor_readings collection: {e}")
+
+    def _ensure_indexes(self):
+        """Create the index backing the alert dedupe upsert filter"""
+        try:
+            self.sync_db.alerts.create_index([
+                ("pond_id", pymongo.ASCENDING),
+                ("parameter", pymongo.ASCENDING),
+                ("is_resolved", pymongo.ASCENDING),
+                ("created_at", pymongo.DESCENDING)
+            ])
+        except Exception as e:
+            logger.error(f"Failed to create alert indexes: {e}")
+
+    def _prime_recent_alerts(self):
+        """Load the latest unresolved alert per pond/parameter into the dedupe cache"""
+        try:
+            pipeline = [
+                {"$match": {
+                    "is_resolved": False,
+                    "created_at": {"$gte": datetime.utcnow() - ALERT_DEDUPE_WINDOW}
+                }},
+                {"$group": {
+                    "_id": {"pond_id": "$pond_id", "parameter": "$parameter"},
+                    "last_created": {"$max": "$created_at"}
+                }}
+            ]
+            for row in self.sync_db.alerts.aggregate(pipeline):
+                key = (row["_id"].get("pond_id"), row["_id"].get("parameter"))
+                self._recent_alerts[key] = row["last_created"]
+            logger.info(f"Primed alert dedupe cache with {len(self._recent_alerts)} entries")
+        except Exception as e:
+            logger.error(f"Failed to prime alert dedupe cache: {e}")
+
     def setup_client(self):
         """Set up MQTT client with callbacks"""
         self.client = mqtt.Client(client_id="pond_monitoring_mvp")
+        self.client.max_inflight_messages_set(MQTT_MAX_INFLIGHT)
+        self.client.max_queued_messages_set(MQTT_MAX_QUEUED)
+        self.client.reconnect_delay_set(min_delay=MQTT_RECONNECT_MIN_DELAY, max_delay=MQTT_RECONNECT_MAX_DELAY)
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
         self.client.on_disconnect = self.on_disconnect
@@ -48,9 +162,13 @@ class SimpleMQTTHandler:
         if rc == 0:
             self.is_connected = True
             logger.info("🟢 Connected to MQTT broker")
-            # Subscribe to pond data topics
+            # Disable Nagle so acks are not held back waiting for more data
+            sock = client.socket()
+            if sock:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # Subscribe to pond data topics; the wildcard already covers
+            # sensors/pond_data, so subscribing to it too doubles delivery
             topics = [
-                ("sensors/pond_data", 0),
                 ("sensors/+", 0),
             ]
             
@@ -68,33 +186,39 @@ class SimpleMQTTHandler:
     def on_message(self, client, userdata, msg):
         """Process incoming MQTT messages"""
         try:
-            # Parse JSON payload
-            payload_str = msg.payload.decode('utf-8')
-            payload = json.loads(payload_str)
+            payload = self._decode_payload(msg.payload)
             
-            logger.info(f"📩 Received from {msg.topic}: {payload}")
+            logger.info("📩 Received from %s: %s", msg.topic, payload)
             
-            # Process based on topic
-            if msg.topic == "sensors/pond_data":
+            # Every sensors/* topic carries a pond reading
+            if msg.topic.startswith("sensors/"):
                 self._process_pond_data(payload)
-            elif msg.topic.startswith("sensors/"):
-                self._process_sensor_data(msg.topic, payload)
                 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"❌ JSON decode error: {e}")
+        except (msgpack.UnpackException, ValueError) as e:
+            logger.error(f"❌ MessagePack decode error: {e}")
         except Exception as e:
             logger.error(f"❌ Error processing message: {e}")
 
+    @staticmethod
+    def _decode_payload(raw: bytes) -> Dict[str, Any]:
+        """Decode a MessagePack payload, falling back to JSON for legacy devices"""
+        if raw and raw[0] in JSON_PAYLOAD_PREFIXES:
+            return orjson.loads(raw)
+        return msgpack.unpackb(raw, raw=False)
+
     def _process_pond_data(self, data: Dict[str, Any]):
         """Process pond sensor data and check for alerts"""
         try:
             pond_id = data.get('pond_id', 'pond_001')  # Default to pond_001 for MVP
+            now = datetime.utcnow()
             
             # Store sensor reading
             reading_doc = {
                 'pond_id': pond_id,
                 'device_id': data.get('device_id', 'unknown'),
-                'timestamp': datetime.utcnow(),
+                'timestamp': now,
                 'ph': data.get('ph'),
                 'temperature': data.get('temperature'),
                 'dissolved_oxygen': data.get('dissolved_oxygen'),
@@ -103,128 +227,167 @@ class SimpleMQTTHandler:
                 'nitrite': data.get('nitrite'),
                 'ammonia': data.get('ammonia'),
                 'water_level': data.get('water_level'),
-                'created_at': datetime.utcnow()
+                'created_at': now
             }
 
             # Insert into database
-            result = self.sync_db.sensor_readings.insert_one(reading_doc)
-            logger.info(f"💾 Stored reading for {pond_id}: {result.inserted_id}")
+            result = self.readings_collection.insert_one(reading_doc)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("💾 Stored reading for %s: %s", pond_id, result.inserted_id)
 
             # Broadcast to WebSocket clients (schedule if no event loop)
             websocket_data = {
                 "pond_id": pond_id,
-                "timestamp": reading_doc['timestamp'].isoformat(),
-                **{k: v for k, v in reading_doc.items() if k not in ['_id', 'created_at']}
+                "timestamp": now,
+                "device_id": reading_doc['device_id'],
+                "ph": reading_doc['ph'],
+                "temperature": reading_doc['temperature'],
+                "dissolved_oxygen": reading_doc['dissolved_oxygen'],
+                "turbidity": reading_doc['turbidity'],
+                "nitrate": reading_doc['nitrate'],
+                "nitrite": reading_doc['nitrite'],
+                "ammonia": reading_doc['ammonia'],
+                "water_level": reading_doc['water_level']
             }
             
-            # Schedule WebSocket broadcast safely
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_running():
-                    asyncio.create_task(websocket_manager.broadcast_sensor_data(websocket_data))
-                else:
-                    asyncio.run(websocket_manager.broadcast_sensor_data(websocket_data))
-            except RuntimeError:
-                # No event loop running, skip WebSocket broadcast
+            # Hand the reading to the application loop for a coalesced broadcast
+            if self._loop is None:
                 logger.debug("No event loop available for WebSocket broadcast")
-            except Exception as e:
-                logger.error(f"WebSocket broadcast error: {e}")
+            else:
+                self._loop.call_soon_threadsafe(websocket_manager.queue_sensor_data, websocket_data)
 
             # Check for threshold violations
-            self._check_thresholds(pond_id, data, result.inserted_id)
+            self._check_thresholds(pond_id, data, result.inserted_id, now)
 
         except Exception as e:
             logger.error(f"❌ Error processing pond data: {e}")
 
-    def _process_sensor_data(self, topic: str, data: Dict[str, Any]):
-        """Process generic sensor data"""
-        try:
-            # Extract pond_id from topic or data
-            pond_id = data.get('pond_id', 'pond_001')
-            logger.info(f"🌊 Processing sensor data for {pond_id}")
-            
-            # Forward to pond data processor
-            self._process_pond_data(data)
-            
-        except Exception as e:
-            logger.error(f"❌ Error processing sensor data: {e}")
-
-    def _check_thresholds(self, pond_id: str, sensor_data: Dict[str, Any], reading_id):
+    @staticmethod
+    def _build_thresholds() -> Dict[str, Dict[str, float]]:
+        """Define thresholds for MVP"""
+        return {
+            'ph': {'min': settings.ph_min, 'max': settings.ph_max, 'critical_min': 6.0, 'critical_max': 9.0},
+            'temperature': {'min': settings.temperature_min, 'max': settings.temperature_max, 'critical_min': 15.0, 'critical_max': 35.0},
+            'dissolved_oxygen': {'min': settings.dissolved_oxygen_min, 'max': settings.dissolved_oxygen_max, 'critical_min': 3.0},
+            'turbidity': {'max': settings.turbidity_max, 'critical_max': 20.0},
+            'nitrate': {'max': settings.nitrate_max, 'critical_max': 80.0},
+            'ammonia': {'max': settings.ammonia_max, 'critical_max': 1.0},
+            'water_level': {'min': settings.water_level_min, 'max': settings.water_level_max}
+        }
+
+    @staticmethod
+    def _classify(parameter: str, value: float, limits: Dict[str, float]):
+        """Return (severity, message) for a threshold violation, or None"""
+        # Check critical limits
+        if 'critical_min' in limits and value < limits['critical_min']:
+            return "critical", f"CRITICAL: {parameter.upper()} dangerously low: {value} (limit: {limits['critical_min']})"
+        if 'critical_max' in limits and value > limits['critical_max']:
+            return "critical", f"CRITICAL: {parameter.upper()} dangerously high: {value} (limit: {limits['critical_max']})"
+        # Check normal limits
+        if 'min' in limits and value < limits['min']:
+            return "high", f"HIGH: {parameter.upper()} below threshold: {value} (limit: {limits['min']})"
+        if 'max' in limits and value > limits['max']:
+            return "high", f"HIGH: {parameter.upper()} above threshold: {value} (limit: {limits['max']})"
+        return None
+
+    def _find_violations(self, reading: Dict[str, Any]) -> List[tuple]:
+        """Return (parameter, value, severity, message) for every threshold the reading violates"""
+        violations = []
+        for parameter in THRESHOLD_PARAMETERS:
+            value = reading.get(parameter)
+            if value is None:
+                continue
+            violation = self._classify(parameter, value, self._thresholds[parameter])
+            if violation:
+                violations.append((parameter, value) + violation)
+        return violations
+
+    def forget_alert(self, pond_id: str, parameter: str):
+        """Drop the cached alert time so a resolved alert stops suppressing new ones"""
+        self._recent_alerts.pop((pond_id, parameter), None)
+
+    def _check_thresholds(self, pond_id: str, sensor_data: Dict[str, Any], reading_id, now: datetime):
         """Check sensor values against thresholds and create alerts"""
         try:
             alerts_created = []
+            operations = []
+            candidates = []
+            cutoff = now.replace(second=0, microsecond=0) - ALERT_DEDUPE_WINDOW
             
-            # Define thresholds for MVP
-            thresholds = {
-                'ph': {'min': settings.ph_min, 'max': settings.ph_max, 'critical_min': 6.0, 'critical_max': 9.0},
-                'temperature': {'min': settings.temperature_min, 'max': settings.temperature_max, 'critical_min': 15.0, 'critical_max': 35.0},
-                'dissolved_oxygen': {'min': settings.dissolved_oxygen_min, 'max': settings.dissolved_oxygen_max, 'critical_min': 3.0},
-                'turbidity': {'max': settings.turbidity_max, 'critical_max': 20.0},
-                'nitrate': {'max': settings.nitrate_max, 'critical_max': 80.0},
-                'ammonia': {'max': settings.ammonia_max, 'critical_max': 1.0},
-                'water_level': {'min': settings.water_level_min, 'max': settings.water_level_max}
-            }
+            for parameter, value, severity, message in self._find_violations(sensor_data):
+                limits = self._thresholds[parameter]
 
-            for parameter, limits in thresholds.items():
-                value = sensor_data.get(parameter)
-                if value is None:
+                # Skip the database round-trip when this process alerted recently
+                key = (pond_id, parameter)
+                last_alert = self._recent_alerts.get(key)
+                if last_alert and now - last_alert < ALERT_DEDUPE_WINDOW:
                     continue
 
-                alert_data = None
-                severity = None
-                message = ""
-
-                # Check critical limits
-                if 'critical_min' in limits and value < limits['critical_min']:
-                    severity = "critical"
-                    message = f"CRITICAL: {parameter.upper()} dangerously low: {value} (limit: {limits['critical_min']})"
-                elif 'critical_max' in limits and value > limits['critical_max']:
-                    severity = "critical"
-                    message = f"CRITICAL: {parameter.upper()} dangerously high: {value} (limit: {limits['critical_max']})"
-                # Check normal limits
-                elif 'min' in limits and value < limits['min']:
-                    severity = "high"
-                    message = f"HIGH: {parameter.upper()} below threshold: {value} (limit: {limits['min']})"
-                elif 'max' in limits and value > limits['max']:
-                    severity = "high"
-                    message = f"HIGH: {parameter.upper()} above threshold: {value} (limit: {limits['max']})"
-
-                # Create alert if threshold violated
-                if severity:
-                    # Check if similar alert exists recently (avoid spam)
-                    recent_alert = self.sync_db.alerts.find_one({
+                alert_doc = {
+                    "pond_id": pond_id,
+                    "sensor_reading_id": reading_id,
+                    "alert_type": f"{parameter}_{severity}",
+                    "parameter": parameter,
+                    "current_value": value,
+                    "threshold_value": limits.get('min', limits.get('max')),
+                    "severity": severity,
+                    "message": message,
+                    "is_resolved": False,
+                    "sms_sent": False,
+                    "created_at": now
+                }
+
+                # Upsert only inserts when no similar alert exists recently (avoid spam)
+                operations.append(UpdateOne(
+                    {
                         "pond_id": pond_id,
                         "parameter": parameter,
                         "is_resolved": False,
-                        "created_at": {"$gte": datetime.utcnow().replace(microsecond=0).replace(second=0) - timedelta(minutes=15)}
-                    })
-
-                    if not recent_alert:
-                        alert_doc = {
+                        "created_at": {"$gte": cutoff}
+                    },
+                    {"$setOnInsert": alert_doc},
+                    upsert=True
+                ))
+                candidates.append(alert_doc)
+
+            if operations:
+                result = self.sync_db.alerts.bulk_write(operations, ordered=False)
+
+                # Candidates that matched an existing alert (from another process or
+                # before a restart) are cached with that alert's own creation time
+                matched = [
+                    alert_doc["parameter"] for index, alert_doc in enumerate(candidates)
+                    if index not in result.upserted_ids
+                ]
+                if matched:
+                    existing = self.sync_db.alerts.find(
+                        {
                             "pond_id": pond_id,
-                            "sensor_reading_id": reading_id,
-                            "alert_type": f"{parameter}_{severity}",
-                            "parameter": parameter,
-                            "current_value": value,
-                            "threshold_value": limits.get('min', limits.get('max')),
-                            "severity": severity,
-                            "message": message,
+                            "parameter": {"$in": matched},
                             "is_resolved": False,
-                            "sms_sent": False,
-                            "created_at": datetime.utcnow()
-                        }
-
-                        alert_result = self.sync_db.alerts.insert_one(alert_doc)
-                        alert_doc["_id"] = alert_result.inserted_id
-                        alerts_created.append(alert_doc)
-
-                        logger.warning(f"🚨 {severity.upper()} ALERT for {pond_id}: {message}")
-
-                        # Schedule SMS and WebSocket notifications
-                        self._schedule_notifications(alert_doc)
+                            "created_at": {"$gte": cutoff}
+                        },
+                        {"_id": 0, "parameter": 1, "created_at": 1}
+                    )
+                    for row in existing:
+                        key = (pond_id, row["parameter"])
+                        cached = self._recent_alerts.get(key)
+                        if cached is None or row["created_at"] > cached:
+                            self._recent_alerts[key] = row["created_at"]
+
+                for index, inserted_id in result.upserted_ids.items():
+                    alert_doc = candidates[index]
+                    alert_doc["_id"] = inserted_id
+                    alerts_created.append(alert_doc)
+                    self._recent_alerts[(pond_id, alert_doc["parameter"])] = alert_doc["created_at"]
+
+                    logger.warning("🚨 %s ALERT for %s: %s", alert_doc['severity'].upper(), pond_id, alert_doc['message'])
+
+                    # Schedule SMS and WebSocket notifications
+                    self._schedule_notifications(alert_doc)
 
             if alerts_created:
-                logger.info(f"📢 Created {len(alerts_created)} alerts for {pond_id}")
+                logger.info("📢 Created %d alerts for %s", len(alerts_created), pond_id)
 
         except Exception as e:
             logger.error(f"❌ Error checking thresholds: {e}")
@@ -244,35 +407,68 @@ class SimpleMQTTHandler:
                 "created_at": alert_doc["created_at"].isoformat()
             }
             
-            # Schedule WebSocket broadcast safely
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_running():
-                    asyncio.create_task(websocket_manager.broadcast_alert(websocket_alert))
-                else:
-                    asyncio.run(websocket_manager.broadcast_alert(websocket_alert))
-            except RuntimeError:
+            # Hand the broadcast to the application loop; this runs on paho's network thread
+            loop = self._loop
+            if loop is None:
                 logger.debug("No event loop available for WebSocket alert broadcast")
-            except Exception as e:
-                logger.error(f"WebSocket alert broadcast error: {e}")
+            else:
+                loop.call_soon_threadsafe(
+                    lambda: loop.create_task(websocket_manager.broadcast_alert(websocket_alert))
+                )
 
-            # Schedule SMS for high/critical alerts safely
+            # Queue SMS for high/critical alerts on the application loop
             if alert_doc["severity"] in ["high", "critical"]:
-                try:
-                    loop = asyncio.get_event_loop()
-                    if loop.is_running():
-                        asyncio.create_task(self._send_sms_alert(alert_doc))
-                    else:
-                        asyncio.run(self._send_sms_alert(alert_doc))
-                except RuntimeError:
-                    logger.debug("No event loop available for SMS alert")
-                except Exception as e:
-                    logger.error(f"SMS alert scheduling error: {e}")
+                if self._loop is None:
+                    logger.debug("SMS workers not running, skipping SMS alert")
+                else:
+                    self._loop.call_soon_threadsafe(self._enqueue_sms, alert_doc)
 
         except Exception as e:
             logger.error(f"❌ Error scheduling notifications: {e}")
 
-    async def _send_sms_alert(self, alert_doc: Dict[str, Any]):
+    def _enqueue_sms(self, alert_doc: Dict[str, Any]):
+        """Put an alert on the SMS queue (runs on the event loop)"""
+        try:
+            self._sms_queue.put_nowait(alert_doc)
+        except asyncio.QueueFull:
+            logger.warning(f"SMS queue full, dropping SMS for alert: {alert_doc['_id']}")
+
+    async def _sms_worker(self):
+        """Drain the SMS queue in small batches"""
+        while True:
+            batch = [await self._sms_queue.get()]
+            try:
+                while len(batch) < SMS_BATCH_SIZE:
+                    batch.append(await asyncio.wait_for(self._sms_queue.get(), SMS_BATCH_WAIT))
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                await self._send_sms_batch(batch)
+            except Exception as e:
+                logger.error(f"❌ Error sending SMS batch: {e}")
+            finally:
+                for _ in batch:
+                    self._sms_queue.task_done()
+
+    async def _send_sms_batch(self, batch: List[Dict[str, Any]]):
+        """Send a batch of SMS alerts and mark the sent ones in one update"""
+        results = await asyncio.gather(
+            *(self._send_sms_alert(alert_doc) for alert_doc in batch),
+            return_exceptions=True
+        )
+        sent_ids = [alert_doc["_id"] for alert_doc, sent in zip(batch, results) if sent is True]
+
+        # Update SMS status in database
+        if sent_ids:
+            await asyncio.to_thread(
+                self.sync_db.alerts.update_many,
+                {"_id": {"$in": sent_ids}},
+                {"$set": {"sms_sent": True}}
+            )
+            logger.info(f"📱 SMS sent for {len(sent_ids)} alerts")
+
+    async def _send_sms_alert(self, alert_doc: Dict[str, Any]) -> bool:
         """Send SMS alert using Twilio"""
         try:
             from app.services.sms_service import sms_service
@@ -284,20 +480,12 @@ class SimpleMQTTHandler:
             severity = alert_doc["severity"]
 
             if severity == "critical":
-                sms_sent = await sms_service.send_critical_alert(pond_id, parameter, value, threshold)
-            else:
-                sms_sent = await sms_service.send_high_alert(pond_id, parameter, value, threshold)
-
-            # Update SMS status in database
-            if sms_sent:
-                self.sync_db.alerts.update_one(
-                    {"_id": alert_doc["_id"]},
-                    {"$set": {"sms_sent": True}}
-                )
-                logger.info(f"📱 SMS sent for alert: {alert_doc['_id']}")
+                return await sms_service.send_critical_alert(pond_id, parameter, value, threshold)
+            return await sms_service.send_high_alert(pond_id, parameter, value, threshold)
 
         except Exception as e:
             logger.error(f"❌ Error sending SMS alert: {e}")
+            return False
 
     def connect(self):
         """Connect to MQTT broker"""
@@ -311,6 +499,10 @@ class SimpleMQTTHandler:
         """Start MQTT loop"""
         self.client.loop_forever()
 
+    def start_background(self):
+        """Start paho's own network thread without blocking the caller"""
+        self.client.loop_start()
+
     def stop(self):
         """Stop MQTT client"""
         if self.client:
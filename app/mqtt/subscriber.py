@@ -17,6 +17,13 @@ from app.config import get_settings
 from app.database.connection import connect_to_mongo, close_mongo_connection
 from app.mqtt.client import mqtt_handler
 
+# uvloop's libuv transports make fewer syscalls per write; stdlib asyncio is the fallback
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -33,10 +40,14 @@ settings = get_settings()
 class MQTTSubscriber:
     def __init__(self):
         self.running = False
+        self._loop = None
+        self._shutdown = None
 
     async def start(self):
         """Start the MQTT subscriber"""
         logger.info("Starting MQTT Subscriber...")
+        self._loop = asyncio.get_running_loop()
+        self._shutdown = asyncio.Event()
         
         try:
             # Connect to database
@@ -54,13 +65,11 @@ class MQTTSubscriber:
             self.running = True
             logger.info("MQTT Subscriber started successfully")
             
-            # Start the MQTT loop in a separate thread
-            loop = asyncio.get_event_loop()
-            mqtt_task = loop.run_in_executor(None, mqtt_handler.start_loop)
+            # Let paho run its own network thread
+            mqtt_handler.start_background()
             
-            # Keep the main loop running
-            while self.running:
-                await asyncio.sleep(1)
+            # Wait until a signal requests shutdown
+            await self._shutdown.wait()
                 
         except KeyboardInterrupt:
             logger.info("Received interrupt signal")
@@ -86,6 +95,8 @@ class MQTTSubscriber:
         """Handle system signals for graceful shutdown"""
         logger.info(f"Received signal {signum}")
         self.running = False
+        if self._loop and self._shutdown:
+            self._loop.call_soon_threadsafe(self._shutdown.set)
 
 
 async def main():
@@ -100,6 +111,8 @@ async def main():
 
 
 if __name__ == "__main__":
+    if UVLOOP_AVAILABLE and sys.platform.startswith("linux"):
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
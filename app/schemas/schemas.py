@@ -1,18 +1,34 @@
 from datetime import datetime
-from typing import Optional, List
-from pydantic import BaseModel, Field
+from typing import Optional, List, Annotated
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints
+
+
+# Shared email constraint so both user schemas reuse one compiled pattern
+EMAIL_PATTERN = r"^[\w\.-]+@[\w\.-]+\.\w+$"
+Email = Annotated[str, StringConstraints(pattern=EMAIL_PATTERN)]
+
+# Sensor values arrive as numbers; strict mode skips pydantic's str coercion path
+SensorValue = Annotated[Optional[float], Field(strict=True)]
+
+# Lean config for the high-rate sensor/alert schemas
+HOT_PATH_CONFIG = ConfigDict(
+    extra='ignore',
+    validate_assignment=False,
+    arbitrary_types_allowed=False,
+    str_strip_whitespace=False
+)
 
 
 # User Schemas
 class UserCreate(BaseModel):
     username: str = Field(..., min_length=3, max_length=50)
-    email: str = Field(..., pattern=r"^[\w\.-]+@[\w\.-]+\.\w+$")
+    email: Email
     password: str = Field(..., min_length=6)
 
 
 class UserUpdate(BaseModel):
     username: Optional[str] = Field(None, min_length=3, max_length=50)
-    email: Optional[str] = Field(None, pattern=r"^[\w\.-]+@[\w\.-]+\.\w+$")
+    email: Optional[Email] = None
     is_active: Optional[bool] = None
 
 
@@ -89,23 +105,27 @@ class PondResponse(BaseModel):
 
 # Sensor Reading Schemas
 class SensorReadingCreate(BaseModel):
+    model_config = HOT_PATH_CONFIG
+
     pond_id: str
     timestamp: Optional[datetime] = None
     
     # Core sensor data as required
-    ph: Optional[float] = None                    # pH level
-    temperature: Optional[float] = None           # Temperature in Celsius
-    dissolved_oxygen: Optional[float] = None      # Dissolved Oxygen in mg/L
-    turbidity: Optional[float] = None             # Turbidity in NTU
-    nitrate: Optional[float] = None               # Nitrate in mg/L
-    nitrite: Optional[float] = None               # Nitrite in mg/L
-    ammonia: Optional[float] = None               # Ammonia in mg/L
-    water_level: Optional[float] = None           # Water level in meters
+    ph: SensorValue = None                        # pH level
+    temperature: SensorValue = None               # Temperature in Celsius
+    dissolved_oxygen: SensorValue = None          # Dissolved Oxygen in mg/L
+    turbidity: SensorValue = None                 # Turbidity in NTU
+    nitrate: SensorValue = None                   # Nitrate in mg/L
+    nitrite: SensorValue = None                   # Nitrite in mg/L
+    ammonia: SensorValue = None                   # Ammonia in mg/L
+    water_level: SensorValue = None               # Water level in meters
     
     device_id: Optional[str] = None
 
 
 class SensorReadingResponse(BaseModel):
+    model_config = HOT_PATH_CONFIG
+
     id: str
     pond_id: str
     timestamp: datetime
@@ -139,6 +159,8 @@ class AlertUpdate(BaseModel):
 
 
 class AlertResponse(BaseModel):
+    model_config = HOT_PATH_CONFIG
+
     id: str
     pond_id: str
     alert_type: str
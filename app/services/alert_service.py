@@ -1,7 +1,10 @@
 """
 Alert Service for Monitoring Sensor Thresholds and Managing Alerts
 """
+import asyncio
 import logging
+import time
+from functools import lru_cache
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorDatabase
@@ -13,6 +16,72 @@ from app.websocket.manager import websocket_manager
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Don't spam: a matching unresolved alert inside this window suppresses a new one
+ALERT_DEDUPE_WINDOW = timedelta(minutes=15)
+
+# (pond_id, alert_type) -> time.monotonic() of the last alert stored by this process;
+# a hit inside the dedupe window skips the database check entirely
+_RECENT_ALERTS: Dict[tuple, float] = {}
+
+# Severities that trigger an SMS notification
+_SMS_SEVERITIES = (AlertSeverity.HIGH.value, AlertSeverity.CRITICAL.value)
+
+# (parameter, min, max, critical_min, critical_max); None where a bound does not apply
+_THRESHOLDS = (
+    ("ph", settings.ph_min, settings.ph_max, 6.0, 9.0),
+    ("temperature", settings.temperature_min, settings.temperature_max, 15.0, 35.0),
+    ("dissolved_oxygen", settings.dissolved_oxygen_min, settings.dissolved_oxygen_max, 3.0, 20.0),
+    ("turbidity", None, settings.turbidity_max, None, 20.0),
+    ("nitrate", None, settings.nitrate_max, None, 80.0),
+    ("nitrite", None, settings.nitrite_max, None, 1.0),
+    ("ammonia", None, settings.ammonia_max, None, 1.0),
+    ("water_level", settings.water_level_min, settings.water_level_max, 0.2, 4.0),
+)
+
+# Severity per level index 2*critical_breach + high_breach; 0 means no alert
+_LEVEL_SEVERITIES = (None, AlertSeverity.HIGH, AlertSeverity.CRITICAL, AlertSeverity.CRITICAL)
+
+
+def _build_threshold_table():
+    """Expand _THRESHOLDS into infinity-padded bounds plus per-level lookups"""
+    table = []
+    for parameter, min_threshold, max_threshold, critical_min, critical_max in _THRESHOLDS:
+        high = min_threshold if min_threshold is not None else max_threshold
+        critical = critical_min if critical_min is not None else critical_max
+        table.append((
+            parameter,
+            float("-inf") if min_threshold is None else min_threshold,
+            float("inf") if max_threshold is None else max_threshold,
+            float("-inf") if critical_min is None else critical_min,
+            float("inf") if critical_max is None else critical_max,
+            (None, high, critical, critical),
+            (None, f"{parameter}_high", f"{parameter}_critical", f"{parameter}_critical"),
+        ))
+    return tuple(table)
+
+
+# (parameter, min, max, critical_min, critical_max, thresholds by level, alert types by level)
+_THRESHOLD_TABLE = _build_threshold_table()
+
+
+@lru_cache(maxsize=64)
+def _message_prefix(parameter: str, direction: str) -> str:
+    """Human-readable alert message prefix, e.g. 'Dissolved Oxygen is below threshold:'"""
+    return f"{parameter.replace('_', ' ').title()} is {direction} threshold:"
+
+
+# Fields returned by get_active_alerts; keeps list payloads off the wire
+_ACTIVE_ALERT_PROJECTION = {
+    "pond_id": 1,
+    "parameter": 1,
+    "alert_type": 1,
+    "severity": 1,
+    "message": 1,
+    "current_value": 1,
+    "threshold_value": 1,
+    "created_at": 1,
+}
+
 
 class AlertService:
     def __init__(self, db: AsyncIOMotorDatabase):
@@ -21,134 +90,87 @@ class AlertService:
 
     async def check_sensor_thresholds(self, sensor_reading: Dict[str, Any]) -> List[Alert]:
         """Check sensor reading against thresholds and create alerts"""
-        alerts = []
+        alert_docs = self._evaluate_thresholds(sensor_reading)
+        alert_docs = await self._drop_duplicates(sensor_reading.get("pond_id", "unknown"), alert_docs)
+        return await self._store_alerts(alert_docs)
+
+    @staticmethod
+    def _evaluate_thresholds(sensor_reading: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Build an alert document for every threshold the reading violates; no I/O"""
         pond_id = sensor_reading.get("pond_id", "unknown")
         reading_id = sensor_reading.get("_id")
 
-        # Define thresholds with severity levels
-        threshold_checks = [
-            {
-                "parameter": "ph",
-                "value": sensor_reading.get("ph"),
-                "min_threshold": settings.ph_min,
-                "max_threshold": settings.ph_max,
-                "critical_min": 6.0,
-                "critical_max": 9.0
-            },
-            {
-                "parameter": "temperature",
-                "value": sensor_reading.get("temperature"),
-                "min_threshold": settings.temperature_min,
-                "max_threshold": settings.temperature_max,
-                "critical_min": 15.0,
-                "critical_max": 35.0
-            },
-            {
-                "parameter": "dissolved_oxygen",
-                "value": sensor_reading.get("dissolved_oxygen"),
-                "min_threshold": settings.dissolved_oxygen_min,
-                "max_threshold": settings.dissolved_oxygen_max,
-                "critical_min": 3.0,
-                "critical_max": 20.0
-            },
-            {
-                "parameter": "turbidity",
-                "value": sensor_reading.get("turbidity"),
-                "max_threshold": settings.turbidity_max,
-                "critical_max": 20.0
-            },
-            {
-                "parameter": "nitrate",
-                "value": sensor_reading.get("nitrate"),
-                "max_threshold": settings.nitrate_max,
-                "critical_max": 80.0
-            },
-            {
-                "parameter": "nitrite",
-                "value": sensor_reading.get("nitrite"),
-                "max_threshold": settings.nitrite_max,
-                "critical_max": 1.0
-            },
-            {
-                "parameter": "ammonia",
-                "value": sensor_reading.get("ammonia"),
-                "max_threshold": settings.ammonia_max,
-                "critical_max": 1.0
-            },
-            {
-                "parameter": "water_level",
-                "value": sensor_reading.get("water_level"),
-                "min_threshold": settings.water_level_min,
-                "max_threshold": settings.water_level_max,
-                "critical_min": 0.2,
-                "critical_max": 4.0
-            }
-        ]
+        alert_docs = []
+        for parameter, min_threshold, max_threshold, critical_min, critical_max, thresholds, alert_types in _THRESHOLD_TABLE:
+            value = sensor_reading.get(parameter)
+            if value is None:
+                continue
 
-        for check in threshold_checks:
-            if check["value"] is None:
+            level = 2 * (value < critical_min or value > critical_max) + (value < min_threshold or value > max_threshold)
+            if not level:
                 continue
 
-            parameter = check["parameter"]
-            value = check["value"]
-            alert = None
-
-            # Check critical thresholds
-            if ("critical_min" in check and value < check["critical_min"]) or \
-               ("critical_max" in check and value > check["critical_max"]):
-                threshold = check.get("critical_min", check.get("critical_max"))
-                alert = await self._create_alert(
-                    pond_id=pond_id,
-                    parameter=parameter,
-                    current_value=value,
-                    threshold_value=threshold,
-                    severity=AlertSeverity.CRITICAL,
-                    alert_type=f"{parameter}_critical",
-                    reading_id=reading_id
-                )
-
-            # Check high severity thresholds
-            elif ("min_threshold" in check and value < check["min_threshold"]) or \
-                 ("max_threshold" in check and value > check["max_threshold"]):
-                threshold = check.get("min_threshold", check.get("max_threshold"))
-                alert = await self._create_alert(
-                    pond_id=pond_id,
-                    parameter=parameter,
-                    current_value=value,
-                    threshold_value=threshold,
-                    severity=AlertSeverity.HIGH,
-                    alert_type=f"{parameter}_high",
-                    reading_id=reading_id
-                )
+            alert_docs.append(AlertService._build_alert_doc(
+                pond_id=pond_id,
+                parameter=parameter,
+                current_value=value,
+                threshold_value=thresholds[level],
+                severity=_LEVEL_SEVERITIES[level],
+                alert_type=alert_types[level],
+                reading_id=reading_id
+            ))
+        return alert_docs
 
-            if alert:
-                alerts.append(alert)
+    async def _drop_duplicates(self, pond_id: str, alert_docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Remove alerts already raised for this pond inside the dedupe window"""
+        fresh = []
+        for alert_doc in alert_docs:
+            if self._recently_alerted(pond_id, alert_doc["alert_type"]):
+                logger.debug(f"Similar alert already exists for {pond_id} - {alert_doc['parameter']}")
+            else:
+                fresh.append(alert_doc)
+        if not fresh:
+            return fresh
 
-        return alerts
+        # Cache misses: fetch recent unresolved alert types for this pond in one query
+        existing = await self.alerts_collection.find(
+            {
+                "pond_id": pond_id,
+                "alert_type": {"$in": [d["alert_type"] for d in fresh]},
+                "is_resolved": False,
+                "created_at": {"$gte": datetime.utcnow() - ALERT_DEDUPE_WINDOW}
+            },
+            {"alert_type": 1}
+        ).to_list(length=None)
+        existing_types = {a["alert_type"] for a in existing}
+        return [d for d in fresh if d["alert_type"] not in existing_types]
 
-    async def _create_alert(self, pond_id: str, parameter: str, current_value: float, 
-                          threshold_value: float, severity: AlertSeverity, 
-                          alert_type: str, reading_id: Optional[str] = None) -> Alert:
-        """Create and store a new alert"""
-        
-        # Check if similar alert already exists (avoid spam)
-        existing_alert = await self.alerts_collection.find_one({
-            "pond_id": pond_id,
-            "parameter": parameter,
-            "alert_type": alert_type,
-            "is_resolved": False,
-            "created_at": {"$gte": datetime.utcnow() - timedelta(minutes=15)}  # Don't spam within 15 minutes
-        })
+    @staticmethod
+    def _recently_alerted(pond_id: str, alert_type: str) -> bool:
+        """Whether this process stored the same alert inside the dedupe window"""
+        stored_at = _RECENT_ALERTS.get((pond_id, alert_type))
+        return stored_at is not None and time.monotonic() - stored_at < ALERT_DEDUPE_WINDOW.total_seconds()
 
-        if existing_alert:
-            logger.debug(f"Similar alert already exists for {pond_id} - {parameter}")
-            return None
+    @staticmethod
+    def _remember_alerts(alert_docs: List[Dict[str, Any]]) -> None:
+        """Record stored alerts in the dedupe cache and evict expired entries"""
+        now = time.monotonic()
+        window = ALERT_DEDUPE_WINDOW.total_seconds()
+        for key in [k for k, stored_at in _RECENT_ALERTS.items() if now - stored_at >= window]:
+            del _RECENT_ALERTS[key]
+        for alert_doc in alert_docs:
+            _RECENT_ALERTS[(alert_doc["pond_id"], alert_doc["alert_type"])] = now
 
+    @staticmethod
+    def _build_alert_doc(pond_id: str, parameter: str, current_value: float,
+                         threshold_value: float, severity: AlertSeverity,
+                         alert_type: str, reading_id: Optional[str] = None) -> Dict[str, Any]:
+        """Build the alert document stored in MongoDB"""
         # Create alert message
         direction = "below" if current_value < threshold_value else "above"
-        message = f"{parameter.replace('_', ' ').title()} is {direction} threshold: {current_value} (limit: {threshold_value})"
+        message = f"{_message_prefix(parameter, direction)} {current_value} (limit: {threshold_value})"
 
-        alert_data = {
+        return {
             "pond_id": pond_id,
             "sensor_reading_id": reading_id,
             "alert_type": alert_type,
@@ -162,44 +184,69 @@ class AlertService:
             "created_at": datetime.utcnow()
         }
 
-        # Insert alert into database
-        result = await self.alerts_collection.insert_one(alert_data)
-        alert_data["_id"] = result.inserted_id
+    async def _store_alerts(self, alert_docs: List[Dict[str, Any]]) -> List[Alert]:
+        """Insert alerts in one batch, then send their SMS and broadcasts concurrently"""
+        if not alert_docs:
+            return []
+
+        # Insert alerts into database
+        result = await self.alerts_collection.insert_many(alert_docs)
+        for alert_doc, inserted_id in zip(alert_docs, result.inserted_ids):
+            alert_doc["_id"] = inserted_id
+            logger.info(f"Created {alert_doc['severity']} alert for {alert_doc['pond_id']}: {alert_doc['message']}")
+        self._remember_alerts(alert_docs)
 
-        logger.info(f"Created {severity.value} alert for {pond_id}: {message}")
+        # Broadcast alerts via WebSocket, one frame per client, while the SMS go out;
+        # the payload therefore reports sms_sent as it was at insert time
+        broadcast_task = asyncio.create_task(
+            websocket_manager.broadcast_alerts([self._broadcast_payload(d) for d in alert_docs])
+        )
 
         # Send SMS for high and critical alerts
-        if severity in [AlertSeverity.HIGH, AlertSeverity.CRITICAL]:
-            sms_sent = False
-            if severity == AlertSeverity.CRITICAL:
-                sms_sent = await sms_service.send_critical_alert(pond_id, parameter, current_value, threshold_value)
-            elif severity == AlertSeverity.HIGH:
-                sms_sent = await sms_service.send_high_alert(pond_id, parameter, current_value, threshold_value)
-            
-            # Update SMS status
+        sms_docs = [d for d in alert_docs if d["severity"] in _SMS_SEVERITIES]
+        sms_results = await asyncio.gather(*(self._send_sms(d) for d in sms_docs))
+        sent_ids = []
+        for alert_doc, sms_sent in zip(sms_docs, sms_results):
             if sms_sent:
-                await self.alerts_collection.update_one(
-                    {"_id": result.inserted_id},
-                    {"$set": {"sms_sent": True}}
-                )
-                alert_data["sms_sent"] = True
-
-        # Broadcast alert via WebSocket
-        await websocket_manager.broadcast_alert({
-            "id": str(result.inserted_id),
-            "pond_id": pond_id,
-            "parameter": parameter,
-            "current_value": current_value,
-            "threshold_value": threshold_value,
-            "severity": severity.value,
-            "message": message,
-            "sms_sent": alert_data["sms_sent"],
-            "created_at": alert_data["created_at"].isoformat()
-        })
+                alert_doc["sms_sent"] = True
+                sent_ids.append(alert_doc["_id"])
+
+        # Update SMS status
+        if sent_ids:
+            await self.alerts_collection.update_many(
+                {"_id": {"$in": sent_ids}},
+                {"$set": {"sms_sent": True}}
+            )
+        await broadcast_task
+
+        # Convert to Alert models; validation coerces severity to AlertSeverity
+        return [Alert(**alert_doc) for alert_doc in alert_docs]
 
-        # Convert to Alert model
-        alert = Alert(**alert_data)
-        return alert
+    @staticmethod
+    async def _send_sms(alert_doc: Dict[str, Any]) -> bool:
+        """Send the SMS matching an alert's severity"""
+        send = (sms_service.send_critical_alert
+                if alert_doc["severity"] == AlertSeverity.CRITICAL.value
+                else sms_service.send_high_alert)
+        return await send(
+            alert_doc["pond_id"], alert_doc["parameter"],
+            alert_doc["current_value"], alert_doc["threshold_value"]
+        )
+
+    @staticmethod
+    def _broadcast_payload(alert_doc: Dict[str, Any]) -> Dict[str, Any]:
+        """WebSocket representation of a stored alert"""
+        return {
+            "id": str(alert_doc["_id"]),
+            "pond_id": alert_doc["pond_id"],
+            "parameter": alert_doc["parameter"],
+            "current_value": alert_doc["current_value"],
+            "threshold_value": alert_doc["threshold_value"],
+            "severity": alert_doc["severity"],
+            "message": alert_doc["message"],
+            "sms_sent": alert_doc["sms_sent"],
+            "created_at": alert_doc["created_at"].isoformat()
+        }
 
     async def get_active_alerts(self, pond_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get all active (unresolved) alerts"""
@@ -207,7 +254,7 @@ class AlertService:
         if pond_id:
             query["pond_id"] = pond_id
 
-        cursor = self.alerts_collection.find(query).sort("created_at", -1)
+        cursor = self.alerts_collection.find(query, _ACTIVE_ALERT_PROJECTION).sort("created_at", -1)
         alerts = await cursor.to_list(length=100)
         
         # Convert ObjectId to string
@@ -233,9 +280,10 @@ class AlertService:
     async def resolve_alert(self, alert_id: str, user_id: Optional[str] = None) -> bool:
         """Mark alert as resolved"""
         from bson import ObjectId
+        from app.mqtt.simple_client import simple_mqtt_handler
         
         try:
-            result = await self.alerts_collection.update_one(
+            alert = await self.alerts_collection.find_one_and_update(
                 {"_id": ObjectId(alert_id)},
                 {
                     "$set": {
@@ -243,10 +291,15 @@ class AlertService:
                         "resolved_at": datetime.utcnow(),
                         "resolved_by": user_id
                     }
-                }
+                },
+                projection={"pond_id": 1, "alert_type": 1, "parameter": 1}
             )
             
-            if result.modified_count > 0:
+            if alert:
+                # A resolved alert must not keep suppressing new ones
+                _RECENT_ALERTS.pop((alert["pond_id"], alert["alert_type"]), None)
+                if alert.get("parameter"):
+                    simple_mqtt_handler.forget_alert(alert["pond_id"], alert["parameter"])
                 logger.info(f"Alert {alert_id} resolved by user {user_id}")
                 return True
             return False
@@ -261,9 +314,14 @@ class AlertService:
         start_date = datetime.utcnow() - timedelta(days=days)
         match_filter = {"created_at": {"$gte": start_date}}
         
+        active_filter = {"is_resolved": False}
+        
         if pond_id:
             match_filter["pond_id"] = pond_id
+            active_filter["pond_id"] = pond_id
 
+        # Period statistics and the active-alert count run concurrently; each
+        # query starts with its own $match so both can use the alerts indexes
         pipeline = [
             {"$match": match_filter},
             {
@@ -279,15 +337,17 @@ class AlertService:
             }
         ]
 
-        cursor = self.alerts_collection.aggregate(pipeline)
-        results = await cursor.to_list(length=None)
+        results, active_count = await asyncio.gather(
+            self.alerts_collection.aggregate(pipeline).to_list(length=None),
+            self.alerts_collection.count_documents(active_filter)
+        )
 
         # Process results
         stats = {
             "total_alerts": 0,
             "by_severity": {"low": 0, "medium": 0, "high": 0, "critical": 0},
             "by_parameter": {},
-            "active_alerts": len(await self.get_active_alerts(pond_id)),
+            "active_alerts": active_count,
             "period_days": days
         }
 
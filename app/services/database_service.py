@@ -1,7 +1,9 @@
 from datetime import datetime
-from typing import List, Optional
+from functools import lru_cache
+from typing import List, Optional, Union
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 from app.models.models import User, Farm, Pond, SensorReading, Alert
 from app.schemas.schemas import (
     UserCreate, UserUpdate, FarmCreate, FarmUpdate, 
@@ -10,6 +12,18 @@ from app.schemas.schemas import (
 from app.auth.auth import get_password_hash
 
 
+@lru_cache(maxsize=1024)
+def _oid(value: str) -> ObjectId:
+    """Parse an id string once; invalid ids raise and are never cached"""
+    return ObjectId(value)
+
+
+@lru_cache(maxsize=4096)
+def _pond_key(pond_id: str) -> Union[ObjectId, str]:
+    """Stored form of a pond id: ObjectId when valid, otherwise the name as-is"""
+    return _oid(pond_id) if ObjectId.is_valid(pond_id) else pond_id
+
+
 class UserService:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
@@ -34,34 +48,30 @@ class UserService:
 
     async def get_user_by_id(self, user_id: str) -> Optional[User]:
         """Get user by ID"""
-        user_data = await self.collection.find_one({"_id": ObjectId(user_id)})
-        return User(**user_data) if user_data else None
+        user_data = await self.collection.find_one({"_id": _oid(user_id)})
+        return User.model_construct(**user_data) if user_data else None
 
     async def get_users(self, skip: int = 0, limit: int = 100) -> List[User]:
         """Get list of users"""
         cursor = self.collection.find().skip(skip).limit(limit)
-        users = []
-        async for user_data in cursor:
-            users.append(User(**user_data))
-        return users
+        docs = await cursor.to_list(length=limit)
+        return [User.model_construct(**doc) for doc in docs]
 
     async def update_user(self, user_id: str, user_data: UserUpdate) -> Optional[User]:
         """Update user"""
         update_data = {k: v for k, v in user_data.dict().items() if v is not None}
         update_data["updated_at"] = datetime.utcnow()
         
-        result = await self.collection.update_one(
-            {"_id": ObjectId(user_id)}, 
-            {"$set": update_data}
+        doc = await self.collection.find_one_and_update(
+            {"_id": _oid(user_id)}, 
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER
         )
-        
-        if result.modified_count:
-            return await self.get_user_by_id(user_id)
-        return None
+        return User.model_construct(**doc) if doc else None
 
     async def delete_user(self, user_id: str) -> bool:
         """Delete user"""
-        result = await self.collection.delete_one({"_id": ObjectId(user_id)})
+        result = await self.collection.delete_one({"_id": _oid(user_id)})
         return result.deleted_count > 0
 
 
@@ -73,7 +83,7 @@ class FarmService:
     async def create_farm(self, farm_data: FarmCreate, owner_id: str) -> Farm:
         """Create a new farm"""
         farm_dict = farm_data.dict()
-        farm_dict["owner_id"] = ObjectId(owner_id)
+        farm_dict["owner_id"] = _oid(owner_id)
         
         result = await self.collection.insert_one(farm_dict)
         farm_dict["_id"] = result.inserted_id
@@ -81,34 +91,30 @@ class FarmService:
 
     async def get_farm_by_id(self, farm_id: str) -> Optional[Farm]:
         """Get farm by ID"""
-        farm_data = await self.collection.find_one({"_id": ObjectId(farm_id)})
-        return Farm(**farm_data) if farm_data else None
+        farm_data = await self.collection.find_one({"_id": _oid(farm_id)})
+        return Farm.model_construct(**farm_data) if farm_data else None
 
     async def get_farms_by_owner(self, owner_id: str, skip: int = 0, limit: int = 100) -> List[Farm]:
         """Get farms by owner"""
-        cursor = self.collection.find({"owner_id": ObjectId(owner_id)}).skip(skip).limit(limit)
-        farms = []
-        async for farm_data in cursor:
-            farms.append(Farm(**farm_data))
-        return farms
+        cursor = self.collection.find({"owner_id": _oid(owner_id)}).skip(skip).limit(limit)
+        docs = await cursor.to_list(length=limit)
+        return [Farm.model_construct(**doc) for doc in docs]
 
     async def update_farm(self, farm_id: str, farm_data: FarmUpdate) -> Optional[Farm]:
         """Update farm"""
         update_data = {k: v for k, v in farm_data.dict().items() if v is not None}
         update_data["updated_at"] = datetime.utcnow()
         
-        result = await self.collection.update_one(
-            {"_id": ObjectId(farm_id)}, 
-            {"$set": update_data}
+        doc = await self.collection.find_one_and_update(
+            {"_id": _oid(farm_id)}, 
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER
         )
-        
-        if result.modified_count:
-            return await self.get_farm_by_id(farm_id)
-        return None
+        return Farm.model_construct(**doc) if doc else None
 
     async def delete_farm(self, farm_id: str) -> bool:
         """Delete farm"""
-        result = await self.collection.delete_one({"_id": ObjectId(farm_id)})
+        result = await self.collection.delete_one({"_id": _oid(farm_id)})
         return result.deleted_count > 0
 
 
@@ -120,7 +126,7 @@ class PondService:
     async def create_pond(self, pond_data: PondCreate) -> Pond:
         """Create a new pond"""
         pond_dict = pond_data.dict()
-        pond_dict["farm_id"] = ObjectId(pond_data.farm_id)
+        pond_dict["farm_id"] = _oid(pond_data.farm_id)
         
         result = await self.collection.insert_one(pond_dict)
         pond_dict["_id"] = result.inserted_id
@@ -128,34 +134,30 @@ class PondService:
 
     async def get_pond_by_id(self, pond_id: str) -> Optional[Pond]:
         """Get pond by ID"""
-        pond_data = await self.collection.find_one({"_id": ObjectId(pond_id)})
-        return Pond(**pond_data) if pond_data else None
+        pond_data = await self.collection.find_one({"_id": _oid(pond_id)})
+        return Pond.model_construct(**pond_data) if pond_data else None
 
     async def get_ponds_by_farm(self, farm_id: str, skip: int = 0, limit: int = 100) -> List[Pond]:
         """Get ponds by farm"""
-        cursor = self.collection.find({"farm_id": ObjectId(farm_id)}).skip(skip).limit(limit)
-        ponds = []
-        async for pond_data in cursor:
-            ponds.append(Pond(**pond_data))
-        return ponds
+        cursor = self.collection.find({"farm_id": _oid(farm_id)}).skip(skip).limit(limit)
+        docs = await cursor.to_list(length=limit)
+        return [Pond.model_construct(**doc) for doc in docs]
 
     async def update_pond(self, pond_id: str, pond_data: PondUpdate) -> Optional[Pond]:
         """Update pond"""
         update_data = {k: v for k, v in pond_data.dict().items() if v is not None}
         update_data["updated_at"] = datetime.utcnow()
         
-        result = await self.collection.update_one(
-            {"_id": ObjectId(pond_id)}, 
-            {"$set": update_data}
+        doc = await self.collection.find_one_and_update(
+            {"_id": _oid(pond_id)}, 
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER
         )
-        
-        if result.modified_count:
-            return await self.get_pond_by_id(pond_id)
-        return None
+        return Pond.model_construct(**doc) if doc else None
 
     async def delete_pond(self, pond_id: str) -> bool:
         """Delete pond"""
-        result = await self.collection.delete_one({"_id": ObjectId(pond_id)})
+        result = await self.collection.delete_one({"_id": _oid(pond_id)})
         return result.deleted_count > 0
 
 
@@ -167,20 +169,17 @@ class SensorReadingService:
     async def create_reading(self, reading_data: SensorReadingCreate) -> SensorReading:
         """Create a new sensor reading"""
         reading_dict = reading_data.dict()
+        now = datetime.utcnow()
         if not reading_dict.get("timestamp"):
-            reading_dict["timestamp"] = datetime.utcnow()
+            reading_dict["timestamp"] = now
         
         # Add created_at field
-        reading_dict["created_at"] = datetime.utcnow()
+        reading_dict["created_at"] = now
         
-        # Handle pond_id - store as string if it's not a valid ObjectId
+        # Handle pond_id - names like "pond_001" are kept as strings
         pond_id = reading_dict.get("pond_id")
         if isinstance(pond_id, str):
-            if ObjectId.is_valid(pond_id):
-                reading_dict["pond_id"] = ObjectId(pond_id)
-            else:
-                # Keep as string for pond names like "pond_001", "pond1", etc.
-                reading_dict["pond_id"] = pond_id
+            reading_dict["pond_id"] = _pond_key(pond_id)
         
         result = await self.collection.insert_one(reading_dict)
         reading_dict["_id"] = result.inserted_id
@@ -188,8 +187,8 @@ class SensorReadingService:
 
     async def get_reading_by_id(self, reading_id: str) -> Optional[SensorReading]:
         """Get reading by ID"""
-        reading_data = await self.collection.find_one({"_id": ObjectId(reading_id)})
-        return SensorReading(**reading_data) if reading_data else None
+        reading_data = await self.collection.find_one({"_id": _oid(reading_id)})
+        return SensorReading.model_construct(**reading_data) if reading_data else None
 
     async def get_readings_by_pond(
         self, 
@@ -202,7 +201,7 @@ class SensorReadingService:
         """Get readings by pond with optional date filtering"""
         # Handle both ObjectId and string pond_id formats
         if ObjectId.is_valid(pond_id):
-            query = {"pond_id": ObjectId(pond_id)}
+            query = {"pond_id": _oid(pond_id)}
         else:
             query = {"pond_id": pond_id}
         
@@ -215,18 +214,16 @@ class SensorReadingService:
             query["timestamp"] = date_filter
         
         cursor = self.collection.find(query).sort("timestamp", -1).skip(skip).limit(limit)
-        readings = []
-        async for reading_data in cursor:
-            readings.append(SensorReading(**reading_data))
-        return readings
+        docs = await cursor.to_list(length=limit)
+        return [SensorReading.model_construct(**doc) for doc in docs]
 
     async def get_latest_reading_by_pond(self, pond_id: str) -> Optional[SensorReading]:
         """Get latest reading for a pond"""
         reading_data = await self.collection.find_one(
-            {"pond_id": ObjectId(pond_id)}, 
+            {"pond_id": _oid(pond_id)}, 
             sort=[("timestamp", -1)]
         )
-        return SensorReading(**reading_data) if reading_data else None
+        return SensorReading.model_construct(**reading_data) if reading_data else None
 
     async def update_reading_anomaly(
         self, 
@@ -242,14 +239,12 @@ class SensorReadingService:
             "anomaly_reasons": anomaly_reasons or []
         }
         
-        result = await self.collection.update_one(
-            {"_id": ObjectId(reading_id)}, 
-            {"$set": update_data}
+        doc = await self.collection.find_one_and_update(
+            {"_id": _oid(reading_id)}, 
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER
         )
-        
-        if result.modified_count:
-            return await self.get_reading_by_id(reading_id)
-        return None
+        return SensorReading.model_construct(**doc) if doc else None
 
 
 class AlertService:
@@ -261,7 +256,7 @@ class AlertService:
         """Create a new alert"""
         alert_dict = alert_data.dict()
         if alert_data.sensor_reading_id:
-            alert_dict["sensor_reading_id"] = ObjectId(alert_data.sensor_reading_id)
+            alert_dict["sensor_reading_id"] = _oid(alert_data.sensor_reading_id)
         
         result = await self.collection.insert_one(alert_dict)
         alert_dict["_id"] = result.inserted_id
@@ -269,7 +264,7 @@ class AlertService:
 
     async def get_alert_by_id(self, alert_id: str) -> Optional[Alert]:
         """Get alert by ID"""
-        alert_data = await self.collection.find_one({"_id": ObjectId(alert_id)})
+        alert_data = await self.collection.find_one({"_id": _oid(alert_id)})
         return Alert(**alert_data) if alert_data else None
 
     async def get_alerts_by_pond(
@@ -280,29 +275,25 @@ class AlertService:
         limit: int = 100
     ) -> List[Alert]:
         """Get alerts by pond"""
-        query = {"pond_id": ObjectId(pond_id)}
+        query = {"pond_id": _oid(pond_id)}
         if acknowledged is not None:
             query["is_acknowledged"] = acknowledged
         
         cursor = self.collection.find(query).sort("created_at", -1).skip(skip).limit(limit)
-        alerts = []
-        async for alert_data in cursor:
-            alerts.append(Alert(**alert_data))
-        return alerts
+        docs = await cursor.to_list(length=limit)
+        return [Alert(**doc) for doc in docs]
 
     async def acknowledge_alert(self, alert_id: str, user_id: str) -> Optional[Alert]:
         """Acknowledge an alert"""
         update_data = {
             "is_acknowledged": True,
-            "acknowledged_by": ObjectId(user_id),
+            "acknowledged_by": _oid(user_id),
             "acknowledged_at": datetime.utcnow()
         }
         
-        result = await self.collection.update_one(
-            {"_id": ObjectId(alert_id)}, 
-            {"$set": update_data}
+        doc = await self.collection.find_one_and_update(
+            {"_id": _oid(alert_id)}, 
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER
         )
-        
-        if result.modified_count:
-            return await self.get_alert_by_id(alert_id)
-        return None
+        return Alert(**doc) if doc else None
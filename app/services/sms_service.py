@@ -1,7 +1,9 @@
 """
 Twilio SMS Service for Alert Notifications
 """
+import asyncio
 import logging
+from datetime import datetime
 from typing import Optional
 from twilio.rest import Client
 from twilio.base.exceptions import TwilioException
@@ -14,6 +16,7 @@ settings = get_settings()
 class TwilioSMSService:
     def __init__(self):
         self.client = None
+        self._enabled = False
         self._initialize_client()
 
     def _initialize_client(self):
@@ -21,6 +24,7 @@ class TwilioSMSService:
         if settings.twilio_account_sid and settings.twilio_auth_token:
             try:
                 self.client = Client(settings.twilio_account_sid, settings.twilio_auth_token)
+                self._enabled = bool(settings.twilio_phone_number and settings.alert_phone_number)
                 logger.info("Twilio SMS service initialized successfully")
             except Exception as e:
                 logger.error(f"Failed to initialize Twilio client: {e}")
@@ -30,9 +34,7 @@ class TwilioSMSService:
 
     def is_enabled(self) -> bool:
         """Check if SMS service is properly configured"""
-        return (self.client is not None and 
-                settings.twilio_phone_number and 
-                settings.alert_phone_number)
+        return self._enabled
 
     async def send_alert_sms(self, message: str, pond_id: str, alert_type: str) -> bool:
         """Send SMS alert for pond monitoring"""
@@ -42,10 +44,11 @@ class TwilioSMSService:
 
         try:
             # Format the message with pond info
-            formatted_message = f"🚨 POND ALERT\n\nPond: {pond_id}\nAlert: {alert_type}\n\n{message}\n\nTime: {logger.time.strftime('%Y-%m-%d %H:%M:%S')}"
+            formatted_message = f"🚨 POND ALERT\n\nPond: {pond_id}\nAlert: {alert_type}\n\n{message}\n\nTime: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}"
             
-            # Send SMS
-            message_obj = self.client.messages.create(
+            # Send SMS without blocking the event loop on Twilio's HTTP round-trip
+            message_obj = await asyncio.to_thread(
+                self.client.messages.create,
                 body=formatted_message,
                 from_=settings.twilio_phone_number,
                 to=settings.alert_phone_number
@@ -79,7 +82,8 @@ class TwilioSMSService:
         try:
             test_message = "🧪 Test message from Pond Monitoring System. SMS notifications are working correctly!"
             
-            message_obj = self.client.messages.create(
+            message_obj = await asyncio.to_thread(
+                self.client.messages.create,
                 body=test_message,
                 from_=settings.twilio_phone_number,
                 to=settings.alert_phone_number
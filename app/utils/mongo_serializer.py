@@ -4,13 +4,35 @@ MongoDB document serialization utilities for FastAPI
 from datetime import datetime
 from typing import Any, Dict, List, Union
 from bson import ObjectId
+import orjson
+from fastapi.responses import JSONResponse
+
+# Exact-type converters for BSON scalars; a dict lookup avoids isinstance chains
+_SERIALIZERS = {
+    ObjectId: str,
+    datetime: datetime.isoformat,
+}
+
+
+def _serialize_value(value: Any) -> Any:
+    """Convert a single BSON value to its JSON-serializable form"""
+    value_type = type(value)
+    converter = _SERIALIZERS.get(value_type)
+    if converter is not None:
+        return converter(value)
+    if value_type is dict:
+        return serialize_mongo_document(value)
+    if value_type is list:
+        return [_serialize_value(item) for item in value]
+    return value
+
 
 def serialize_mongo_document(doc: Dict[str, Any]) -> Dict[str, Any]:
     """
     Convert MongoDB document to JSON-serializable format
     - Convert ObjectId to string
     - Convert datetime to ISO string
-    - Handle nested documents recursively
+    - Handle nested documents and lists
     """
     if doc is None:
         return None
@@ -21,24 +43,8 @@ def serialize_mongo_document(doc: Dict[str, Any]) -> Dict[str, Any]:
         if key == "_id":
             # Convert ObjectId to string with key "id"
             result["id"] = str(value)
-        elif isinstance(value, ObjectId):
-            # Convert any other ObjectId fields to string
-            result[key] = str(value)
-        elif isinstance(value, datetime):
-            # Convert datetime to ISO string
-            result[key] = value.isoformat()
-        elif isinstance(value, dict):
-            # Recursively handle nested documents
-            result[key] = serialize_mongo_document(value)
-        elif isinstance(value, list):
-            # Handle lists that might contain documents
-            result[key] = [
-                serialize_mongo_document(item) if isinstance(item, dict) else item
-                for item in value
-            ]
         else:
-            # Keep other values as-is
-            result[key] = value
+            result[key] = _serialize_value(value)
     
     return result
 
@@ -58,3 +64,24 @@ def clean_mongo_response(data: Union[Dict[str, Any], List[Dict[str, Any]]]) -> U
         return serialize_mongo_document(data)
     else:
         return data
+
+
+def _orjson_default(value: Any) -> Any:
+    """Fallback for types orjson cannot encode natively"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered by orjson, so Mongo documents can be returned
+    as-is without a Python-level rewrite of every field
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_orjson_default,
+            option=orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY,
+        )
@@ -1,93 +1,500 @@
 """
 WebSocket Manager for Real-time Pond Data
 """
+import array
+import asyncio
+import itertools
 import json
 import logging
-from typing import List, Dict, Any
+import sys
+from collections import defaultdict
+from typing import Iterable, List, Dict, Any, Optional, Set, Union
+import msgpack
 from fastapi import WebSocket, WebSocketDisconnect
-from datetime import datetime
+from datetime import datetime, timezone
+from app.config import get_settings
+
+# orjson encodes broadcasts several times faster; stdlib json is the fallback
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# NumPy arrays in payloads are packed as typed arrays when available
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Redis is only needed for the cross-worker broadcast backplane
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Broadcast timestamps are reused for this long (seconds) before being rebuilt
+TIMESTAMP_RESOLUTION = 0.001
+
+# Sensor readings arriving within this window go out in one WebSocket frame
+SENSOR_COALESCE_WINDOW = 0.1  # seconds
+
+# Outbound messages buffered per client before it is dropped as a slow consumer
+SEND_QUEUE_SIZE = 256
+
+# Redis channel every worker publishes broadcast events to and fans out from
+BACKPLANE_CHANNEL = "ocea.broadcast"
+
+# MessagePack ext type for float arrays: raw little-endian float32 values
+MSGPACK_EXT_FLOAT32_ARRAY = 0x10
+
+# Wire formats a client can ask for with ?format=; JSON is the default
+FORMAT_JSON = "json"
+FORMAT_MSGPACK = "msgpack"
+
+
+def _encode_default(value: Any) -> Any:
+    """Fallback for values the encoders have no native type for; naive datetimes are UTC"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat()
+    if isinstance(value, array.array) or (NUMPY_AVAILABLE and isinstance(value, np.ndarray)):
+        return value.tolist()
+    return str(value)
+
+
+def _msgpack_default(value: Any) -> Any:
+    """Pack float arrays as float32 ext types instead of one msgpack float per element"""
+    if isinstance(value, array.array) and value.typecode in "fd":
+        packed = value if value.typecode == "f" else array.array("f", value)
+        if sys.byteorder != "little":
+            packed = array.array("f", packed)
+            packed.byteswap()
+        return msgpack.ExtType(MSGPACK_EXT_FLOAT32_ARRAY, packed.tobytes())
+    if NUMPY_AVAILABLE and isinstance(value, np.ndarray) and value.dtype.kind == "f":
+        return msgpack.ExtType(MSGPACK_EXT_FLOAT32_ARRAY, value.astype("<f4").tobytes())
+    return _encode_default(value)
+
+
+def _dumps(message: Dict[str, Any]) -> str:
+    """Serialize a message to JSON text; naive datetimes are emitted as UTC"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(
+            message, default=_encode_default, option=orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY
+        ).decode()
+    return json.dumps(message, default=_encode_default, separators=(",", ":"))
+
+
+def _encode(message: Dict[str, Any], fmt: str) -> Union[str, bytes]:
+    """Serialize a message for one wire format: JSON text or MessagePack bytes"""
+    if fmt == FORMAT_MSGPACK:
+        return msgpack.packb(message, use_bin_type=True, default=_msgpack_default)
+    return _dumps(message)
+
+
+def _frame(payload: Union[str, bytes]) -> Dict[str, Any]:
+    """ASGI send message for an encoded payload: binary for bytes, text for str"""
+    if isinstance(payload, bytes):
+        return {"type": "websocket.send", "bytes": payload}
+    return {"type": "websocket.send", "text": payload}
+
+
+class ConnectionState:
+    """Everything the manager tracks for one connection, in fixed slots"""
+
+    __slots__ = ("id", "websocket", "format", "metadata", "queue", "writer", "rooms", "last_seen")
+
+    def __init__(self, conn_id: int, websocket: WebSocket, metadata: Dict[str, Any]):
+        self.id = conn_id
+        self.websocket = websocket
+        self.format = metadata.get("format", FORMAT_JSON)
+        self.metadata = metadata
+        # Each client drains its own queue, so a slow one can't block the broadcaster
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.writer: Optional[asyncio.Task] = None
+        self.rooms: Set[str] = set()
+        # Loop time the client was last heard from; stale clients are reaped
+        self.last_seen = asyncio.get_running_loop().time()
 
 
 class WebSocketManager:
     def __init__(self):
-        # Store active WebSocket connections
-        self.active_connections: List[WebSocket] = []
-        # Store connection metadata
-        self.connection_metadata: Dict[WebSocket, Dict[str, Any]] = {}
+        # Active connections by integer id; the single source of truth.
+        # Dicts keep insertion order, so the first key is always the oldest connection
+        self.connections: Dict[int, ConnectionState] = {}
+        # WebSocket -> connection id, only consulted at the public API boundary
+        self._ids: Dict[WebSocket, int] = {}
+        self._next_id = itertools.count(1)
+        self.max_connections = settings.websocket_max_connections
+        # Connections closed to make room for newer ones
+        self.evicted_connections = 0
+        # (loop time, ISO string) of the last broadcast timestamp
+        self._ts_cache = (float("-inf"), "")
+        # Sensor readings waiting for the next coalesced flush
+        self._pending_sensors: List[Dict[str, Any]] = []
+        self._sensor_flush_handle = None
+        # pond_id -> ids of clients subscribed to it; clients without subscriptions get every pond
+        self.rooms: Dict[str, Set[int]] = defaultdict(set)
+        self._firehose: Set[int] = set()
+        # Redis backplane; None means events are fanned out to local clients directly
+        self._redis = None
+        self._backplane_task: Optional[asyncio.Task] = None
+        # Periodic ping and idle sweep, so half-open connections don't pile up
+        self._reaper_task: Optional[asyncio.Task] = None
+        # Broadcast events that can travel over the backplane, by name
+        self._event_handlers = {
+            "sensor_batch": self._local_sensor_data_batch,
+            "alerts": self._local_alerts,
+            "pond_status": self._local_pond_status,
+        }
+
+    async def start_backplane(self):
+        """Subscribe to the Redis backplane when REDIS_URL is configured"""
+        if not settings.redis_url:
+            return
+        if not REDIS_AVAILABLE:
+            logger.warning("REDIS_URL is set but the redis package is not installed; broadcasts stay local")
+            return
+        self._redis = aioredis.from_url(settings.redis_url)
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(BACKPLANE_CHANNEL)
+        self._backplane_task = asyncio.create_task(self._backplane_listener(pubsub))
+        logger.info(f"WebSocket backplane subscribed to {BACKPLANE_CHANNEL}")
+
+    async def stop_backplane(self):
+        """Stop listening to the backplane and close the Redis connection"""
+        if self._backplane_task is not None:
+            self._backplane_task.cancel()
+            await asyncio.gather(self._backplane_task, return_exceptions=True)
+            self._backplane_task = None
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    async def _backplane_listener(self, pubsub):
+        """Fan out every event published by any worker to this worker's clients"""
+        try:
+            async for item in pubsub.listen():
+                if item["type"] != "message":
+                    continue
+                try:
+                    event, args = msgpack.unpackb(item["data"], raw=False)
+                    await self._event_handlers[event](*args)
+                except Exception as e:
+                    logger.error(f"Error handling backplane event: {e}")
+        finally:
+            await pubsub.close()
+
+    async def _fanout(self, event: str, *args):
+        """Publish an event to every worker, or handle it locally without a backplane"""
+        if self._redis is not None:
+            try:
+                payload = msgpack.packb([event, list(args)], use_bin_type=True, default=_encode_default)
+                await self._redis.publish(BACKPLANE_CHANNEL, payload)
+                return
+            except Exception as e:
+                logger.error(f"Error publishing to backplane, broadcasting locally: {e}")
+        await self._event_handlers[event](*args)
+
+    def start_reaper(self):
+        """Start pinging clients and closing the ones that stopped answering"""
+        if self._reaper_task is None and settings.websocket_idle_timeout > 0:
+            self._reaper_task = asyncio.create_task(self._reap())
+
+    async def stop_reaper(self):
+        """Stop the idle-connection sweep"""
+        if self._reaper_task is not None:
+            self._reaper_task.cancel()
+            await asyncio.gather(self._reaper_task, return_exceptions=True)
+            self._reaper_task = None
+
+    async def _reap(self):
+        """Every ping interval, close idle clients and ping the rest"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(settings.websocket_ping_interval)
+            try:
+                deadline = loop.time() - settings.websocket_idle_timeout
+                idle = [state for state in self.connections.values() if state.last_seen < deadline]
+                for state in idle:
+                    self._drop(state.id)
+                    try:
+                        await state.websocket.close(code=1001)
+                    except Exception as e:
+                        logger.debug("Error closing idle WebSocket: %s", e)
+                if idle:
+                    logger.warning("Closed %d idle WebSocket connections", len(idle))
+                # Clients answer with any message, which counts as activity
+                await self.broadcast({"type": "ping", "timestamp": self._now_iso()})
+            except Exception as e:
+                logger.error(f"Error sweeping idle WebSocket connections: {e}")
 
-    async def connect(self, websocket: WebSocket, client_info: Dict[str, Any] = None):
-        """Accept WebSocket connection and store metadata"""
+    def touch(self, websocket: WebSocket):
+        """Record activity from a client so the reaper keeps it"""
+        state = self._state(websocket)
+        if state is not None:
+            state.last_seen = asyncio.get_running_loop().time()
+
+    async def connect(self, websocket: WebSocket, client_info: Dict[str, Any] = None) -> int:
+        """Accept WebSocket connection, store its state and return its connection id"""
         await websocket.accept()
-        self.active_connections.append(websocket)
-        self.connection_metadata[websocket] = client_info or {}
-        logger.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
+
+        # At capacity: close the oldest connection to make room
+        while self.connections and len(self.connections) >= self.max_connections:
+            oldest = next(iter(self.connections.values()))
+            self._drop(oldest.id)
+            self.evicted_connections += 1
+            try:
+                await oldest.websocket.close(code=1013)
+            except Exception as e:
+                logger.debug(f"Error closing evicted WebSocket: {e}")
+            logger.warning(f"WebSocket limit of {self.max_connections} reached; evicted the oldest connection")
+
+        state = ConnectionState(next(self._next_id), websocket, client_info or {})
+        state.writer = asyncio.create_task(self._writer(state))
+        self.connections[state.id] = state
+        self._ids[websocket] = state.id
+        self._firehose.add(state.id)
+        logger.info("WebSocket connected. Total connections: %d", len(self.connections))
+        return state.id
+
+    def _state(self, websocket: WebSocket) -> Optional[ConnectionState]:
+        """State of a connected WebSocket, or None once it has disconnected"""
+        return self.connections.get(self._ids.get(websocket))
+
+    async def _writer(self, state: ConnectionState):
+        """Send queued payloads to one client until it fails or disconnects"""
+        try:
+            while True:
+                frame = await state.queue.get()
+                await state.websocket.send(frame)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # Per-client failures are routine during disconnect storms; keep them cheap
+            logger.debug("Error sending message to WebSocket: %s", e)
+            self._drop(state.id)
 
     def disconnect(self, websocket: WebSocket):
         """Remove WebSocket connection"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-            if websocket in self.connection_metadata:
-                del self.connection_metadata[websocket]
-        logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
+        conn_id = self._ids.get(websocket)
+        if conn_id is not None:
+            self._drop(conn_id)
+        logger.debug("WebSocket disconnected. Total connections: %d", len(self.connections))
 
-    async def send_personal_message(self, message: Dict[str, Any], websocket: WebSocket):
-        """Send message to specific WebSocket connection"""
+    def _drop(self, conn_id: int):
+        """Release everything a connection holds; safe to call more than once"""
+        state = self.connections.pop(conn_id, None)
+        if state is None:
+            return
+        self._ids.pop(state.websocket, None)
+        # Keep releasing resources even if one step fails
         try:
-            await websocket.send_text(json.dumps(message))
+            if state.writer is not None and state.writer is not asyncio.current_task():
+                state.writer.cancel()
         except Exception as e:
-            logger.error(f"Error sending message to WebSocket: {e}")
-            self.disconnect(websocket)
+            logger.warning(f"Error stopping WebSocket writer: {e}")
+        while not state.queue.empty():
+            state.queue.get_nowait()
+        self._firehose.discard(conn_id)
+        for pond_id in state.rooms:
+            self._leave_room(conn_id, pond_id)
+        state.rooms.clear()
 
-    async def broadcast(self, message: Dict[str, Any]):
-        """Send message to all connected WebSocket clients"""
-        if not self.active_connections:
+    def subscribe(self, websocket: WebSocket, pond_id: str):
+        """Limit a client's pond-specific broadcasts to the ponds it subscribed to"""
+        state = self._state(websocket)
+        if state is None:
             return
+        state.rooms.add(pond_id)
+        self.rooms[pond_id].add(state.id)
+        self._firehose.discard(state.id)
 
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(json.dumps(message))
-            except Exception as e:
-                logger.error(f"Error broadcasting to WebSocket: {e}")
-                disconnected.append(connection)
+    def unsubscribe(self, websocket: WebSocket, pond_id: str):
+        """Drop a pond subscription; a client left with none receives every pond again"""
+        state = self._state(websocket)
+        if state is None or pond_id not in state.rooms:
+            return
+        state.rooms.discard(pond_id)
+        self._leave_room(state.id, pond_id)
+        if not state.rooms:
+            self._firehose.add(state.id)
+
+    def _leave_room(self, conn_id: int, pond_id: str):
+        """Remove a client from one room, dropping the room once it is empty"""
+        members = self.rooms.get(pond_id)
+        if members is not None:
+            members.discard(conn_id)
+            if not members:
+                del self.rooms[pond_id]
+
+    def _pond_audience(self, pond_id: Optional[str]) -> Set[int]:
+        """Ids of the clients that should receive an update about one pond"""
+        members = self.rooms.get(pond_id)
+        return self._firehose | members if members else self._firehose
+
+    def _enqueue(self, state: ConnectionState, frame: Dict[str, Any]) -> bool:
+        """Queue a frame for a client; False if the client is too far behind"""
+        try:
+            state.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            logger.debug("WebSocket client is not keeping up; disconnecting it")
+            return False
 
-        # Clean up disconnected WebSockets
-        for connection in disconnected:
-            self.disconnect(connection)
+    async def send_personal_message(self, message: Dict[str, Any], websocket: WebSocket):
+        """Send message to specific WebSocket connection"""
+        state = self._state(websocket)
+        if state is not None and not self._enqueue(state, _frame(_encode(message, state.format))):
+            self._drop(state.id)
+
+    async def broadcast(self, message: Dict[str, Any], conn_ids: Optional[Iterable[int]] = None):
+        """Send message to the given connection ids, or to all connected WebSocket clients"""
+        # Snapshot the recipients so disconnects during the fan-out can't skip anyone
+        connections = self.connections
+        if conn_ids is None:
+            states = tuple(connections.values())
+        else:
+            states = tuple(connections[conn_id] for conn_id in conn_ids if conn_id in connections)
+        if not states:
+            return
+        # Each wire format in use is encoded and framed once per broadcast
+        formats = {state.format for state in states}
+        await self._broadcast_encoded({fmt: _frame(_encode(message, fmt)) for fmt in formats}, states)
+
+    async def _broadcast_encoded(self, frames: Dict[str, Dict[str, Any]], states: Iterable[ConnectionState]):
+        """Queue a pre-built ASGI frame, keyed by wire format, for the given clients"""
+        # Writer tasks do the actual sends; clients with a full queue are dropped.
+        # Every client of a format shares the same frame object, which is never mutated
+        dropped: List[int] = []
+        queue_full = asyncio.QueueFull
+        if len(frames) == 1:
+            # Single wire format (the common case): no per-client frame lookup
+            frame = next(iter(frames.values()))
+            for state in states:
+                try:
+                    state.queue.put_nowait(frame)
+                except queue_full:
+                    dropped.append(state.id)
+        else:
+            for state in states:
+                try:
+                    state.queue.put_nowait(frames[state.format])
+                except queue_full:
+                    dropped.append(state.id)
+        for conn_id in dropped:
+            self._drop(conn_id)
+        if dropped:
+            # One aggregated record per broadcast instead of one per client
+            logger.warning("Broadcast dropped %d slow or closed WebSocket clients", len(dropped))
 
     async def broadcast_sensor_data(self, sensor_data: Dict[str, Any]):
-        """Broadcast sensor reading to all clients"""
-        message = {
-            "type": "sensor_data",
-            "data": sensor_data,
-            "timestamp": datetime.utcnow().isoformat()
+        """Broadcast sensor reading to all clients, coalesced with other recent readings"""
+        self.queue_sensor_data(sensor_data)
+
+    def queue_sensor_data(self, sensor_data: Dict[str, Any]):
+        """Buffer a reading and arm the flush timer; must run on the event loop"""
+        self._pending_sensors.append(sensor_data)
+        if self._sensor_flush_handle is None:
+            self._sensor_flush_handle = asyncio.get_running_loop().call_later(
+                SENSOR_COALESCE_WINDOW, self._flush_sensor_data
+            )
+
+    def _flush_sensor_data(self):
+        """Broadcast everything buffered since the timer was armed"""
+        readings, self._pending_sensors = self._pending_sensors, []
+        self._sensor_flush_handle = None
+        if readings:
+            asyncio.create_task(self.broadcast_sensor_data_batch(readings))
+
+    async def broadcast_sensor_data_batch(self, readings: List[Dict[str, Any]]):
+        """Broadcast several sensor readings in a single frame, without coalescing"""
+        await self._fanout("sensor_batch", readings)
+
+    async def _local_sensor_data_batch(self, readings: List[Dict[str, Any]]):
+        """Send a sensor batch to this worker's clients"""
+        # Unsubscribed clients get the whole batch; each pond room gets only its readings
+        await self.broadcast(self._sensor_message(readings), self._firehose)
+        if self.rooms:
+            by_pond = defaultdict(list)
+            for reading in readings:
+                by_pond[reading.get("pond_id")].append(reading)
+            for pond_id, pond_readings in by_pond.items():
+                members = self.rooms.get(pond_id)
+                if members:
+                    await self.broadcast(self._sensor_message(pond_readings), members)
+
+    def _sensor_message(self, readings: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """A single reading as sensor_data, several as one batch"""
+        if len(readings) == 1:
+            return {
+                "type": "sensor_data",
+                "data": readings[0],
+                "timestamp": self._now_iso()
+            }
+        return {
+            "type": "batch",
+            "readings": readings,
+            "timestamp": self._now_iso()
         }
-        await self.broadcast(message)
 
     async def broadcast_alert(self, alert_data: Dict[str, Any]):
         """Broadcast alert to all clients"""
-        message = {
-            "type": "alert",
-            "data": alert_data,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        await self._fanout("alerts", [alert_data])
+
+    async def broadcast_alerts(self, alerts: List[Dict[str, Any]]):
+        """Broadcast several alerts raised together in a single frame"""
+        if alerts:
+            await self._fanout("alerts", alerts)
+
+    async def _local_alerts(self, alerts: List[Dict[str, Any]]):
+        """Send alerts to this worker's clients: one as alert, several as alerts"""
+        if len(alerts) == 1:
+            message = {
+                "type": "alert",
+                "data": alerts[0],
+                "timestamp": self._now_iso()
+            }
+        else:
+            message = {
+                "type": "alerts",
+                "items": alerts,
+                "timestamp": self._now_iso()
+            }
         await self.broadcast(message)
 
     async def broadcast_pond_status(self, pond_id: str, status: Dict[str, Any]):
         """Broadcast pond status update"""
+        await self._fanout("pond_status", pond_id, status)
+
+    async def _local_pond_status(self, pond_id: str, status: Dict[str, Any]):
+        """Send a pond status update to this worker's clients watching the pond"""
         message = {
             "type": "pond_status",
             "pond_id": pond_id,
             "status": status,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": self._now_iso()
         }
-        await self.broadcast(message)
+        await self.broadcast(message, self._pond_audience(pond_id))
+
+    def _now_iso(self) -> str:
+        """Current UTC time in ISO format, rebuilt at most once per TIMESTAMP_RESOLUTION"""
+        now = asyncio.get_running_loop().time()
+        cached_at, iso = self._ts_cache
+        if now - cached_at > TIMESTAMP_RESOLUTION:
+            iso = datetime.utcnow().isoformat()
+            self._ts_cache = (now, iso)
+        return iso
 
     def get_connection_count(self) -> int:
         """Get number of active WebSocket connections"""
-        return len(self.active_connections)
+        return len(self.connections)
 
 
 # Global WebSocket manager instance
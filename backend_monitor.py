@@ -7,14 +7,56 @@ with real MongoDB database storage.
 """
 
 import asyncio
+import itertools
 import json
 import logging
-import time
-from datetime import datetime, timedelta
-from typing import Dict, Any, List
+import math
+import queue
+import socket
+import sys
+import threading
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from operator import attrgetter
+from typing import Dict, Any, List, Optional
 import paho.mqtt.client as mqtt
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING, WriteConcern
 from bson import ObjectId
+from bson.codec_options import CodecOptions
+
+# orjson parses the raw payload bytes several times faster; stdlib json is the fallback
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Newer simulators publish MessagePack; without msgpack only JSON payloads are understood
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+# First bytes of a JSON document; MessagePack maps never start with these
+JSON_PAYLOAD_PREFIXES = frozenset(b'{[ \t\r\n')
+
+
+def _decode_payload(raw: bytes) -> Any:
+    """Decode a JSON or MessagePack payload, picked by its first byte"""
+    if raw[0] in JSON_PAYLOAD_PREFIXES or not MSGPACK_AVAILABLE:
+        return _json_loads(raw)
+    return msgpack.unpackb(raw, raw=False)
+
+# ciso8601 parses ISO timestamps in C; Python 3.11+ fromisoformat already accepts 'Z'
+try:
+    from ciso8601 import parse_datetime as _parse_timestamp
+except ImportError:
+    if sys.version_info >= (3, 11):
+        _parse_timestamp = datetime.fromisoformat
+    else:
+        def _parse_timestamp(value: str) -> datetime:
+            return datetime.fromisoformat(value.replace('Z', '+00:00'))
 
 # Configure logging
 logging.basicConfig(
@@ -23,23 +65,223 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Sensor readings are written to MongoDB in batches of this size...
+MONGO_BATCH_SIZE = 100
+# ...or after this many seconds, whichever comes first
+MONGO_FLUSH_INTERVAL = 0.5
+
+# One MongoClient (and connection pool) per process, shared by every monitor
+_MONGO_CLIENT: Optional[MongoClient] = None
+_MONGO_CLIENT_LOCK = threading.Lock()
+
+# Datetimes are UTC-aware both ways, matching the monitor's timestamps
+_CODEC_OPTIONS = CodecOptions(tz_aware=True, tzinfo=timezone.utc)
+
+
+def get_mongo_client() -> MongoClient:
+    """The process-wide MongoClient, created on first use"""
+    global _MONGO_CLIENT
+    with _MONGO_CLIENT_LOCK:
+        if _MONGO_CLIENT is None:
+            # Compressors the driver can't load are skipped
+            _MONGO_CLIENT = MongoClient(
+                'mongodb://localhost:27017/',
+                maxPoolSize=50,
+                compressors='zstd,snappy,zlib',
+                retryWrites=False,
+                socketTimeoutMS=5000,
+                tz_aware=True,
+                tzinfo=timezone.utc
+            )
+        return _MONGO_CLIENT
+
+
+def close_mongo_client():
+    """Close the shared MongoClient; call once when the process is done with it"""
+    global _MONGO_CLIENT
+    with _MONGO_CLIENT_LOCK:
+        if _MONGO_CLIENT is not None:
+            _MONGO_CLIENT.close()
+            _MONGO_CLIENT = None
+            logger.info("🗄️ Closed MongoDB connection")
+
+# Readings older than this are pruned by a TTL index on created_at
+READING_RETENTION_DAYS = 30
+
+# Reading fields persisted to MongoDB, in document order
+MONGO_FIELDS = (
+    'pond_id', 'device_id', 'timestamp', 'temperature', 'ph', 'dissolved_oxygen',
+    'turbidity', 'ammonia', 'nitrite', 'nitrate', 'salinity', 'water_level',
+    'data_quality', 'battery_level', 'signal_strength', 'location', 'fish_species',
+    'created_at'
+)
+_mongo_values = attrgetter(*MONGO_FIELDS)
+
+# Water quality thresholds, matching the API's defaults
+DO_CRIT_MIN, DO_MIN = 3.0, 5.0
+TEMP_CRIT_MIN, TEMP_CRIT_MAX = 15.0, 35.0
+TEMP_MIN, TEMP_MAX = 20.0, 30.0
+PH_CRIT_MIN, PH_CRIT_MAX = 6.0, 9.0
+PH_MIN, PH_MAX = 6.5, 8.5
+AMMONIA_CRIT_MAX, AMMONIA_MAX = 1.0, 0.5
+LOW_BATTERY = 15  # percent
+
+# (field, critical low, critical high, low, high, critical alert, warning alert), checked in order.
+# Alerts are (alert_type, message template, severity); infinite bounds never trip
+_CONDITION_RULES = (
+    ('dissolved_oxygen', DO_CRIT_MIN, math.inf, DO_MIN, math.inf,
+     ('critical_oxygen', 'Critical low dissolved oxygen: {} mg/L', 'critical'),
+     ('low_oxygen', 'Low dissolved oxygen: {} mg/L', 'high')),
+    ('temperature', TEMP_CRIT_MIN, TEMP_CRIT_MAX, TEMP_MIN, TEMP_MAX,
+     ('temperature_extreme', 'Extreme temperature: {}°C', 'critical'),
+     ('temperature_warning', 'Temperature out of range: {}°C', 'high')),
+    ('ph', PH_CRIT_MIN, PH_CRIT_MAX, PH_MIN, PH_MAX,
+     ('ph_extreme', 'Extreme pH level: {}', 'critical'),
+     ('ph_warning', 'pH out of optimal range: {}', 'high')),
+    ('ammonia', -math.inf, AMMONIA_CRIT_MAX, -math.inf, AMMONIA_MAX,
+     ('ammonia_critical', 'Critical ammonia level: {} mg/L', 'critical'),
+     ('ammonia_high', 'High ammonia level: {} mg/L', 'high')),
+    ('battery_level', -math.inf, math.inf, LOW_BATTERY, math.inf,
+     None,
+     ('low_battery', 'Low device battery: {}%', 'medium')),
+)
+
+# Seconds to wait for the broker's CONNACK
+MQTT_CONNECT_TIMEOUT = 10
+
+# paho flow control: QoS>0 messages in flight, and outgoing messages queued while offline
+MQTT_MAX_INFLIGHT = 200
+MQTT_MAX_QUEUED = 10000
+# Kernel receive buffer requested for the broker socket, to absorb inbound bursts
+MQTT_RCVBUF_BYTES = 1 << 20
+
+# Alerts kept in memory for the statistics printout
+ALERT_HISTORY_SIZE = 10000
+
+# Log prefix per alert severity
+_ALERT_EMOJI = {'critical': '🚨', 'high': '⚠️', 'medium': '📢', 'low': '📝'}
+
+# Messages buffered between paho's network thread and the processing worker
+INGEST_QUEUE_SIZE = 10000
+
+# Recent readings kept per pond for anomaly detection
+HISTORY_SIZE = 64
+# Number of most recent readings anomaly detection averages over
+ANOMALY_WINDOW = 5
+
+
+class SensorReading:
+    """One processed pond reading"""
+    __slots__ = ("id",) + MONGO_FIELDS + ("validation_errors", "is_anomaly", "anomaly_score", "anomaly_reasons")
+
+    def __init__(self, id: str, pond_id: str, device_id: Optional[str], timestamp: datetime,
+                 temperature: Optional[float], ph: Optional[float], dissolved_oxygen: Optional[float],
+                 turbidity: Optional[float], ammonia: Optional[float], nitrite: Optional[float],
+                 nitrate: Optional[float], salinity: Optional[float], water_level: Optional[float],
+                 data_quality: str, battery_level: Optional[float], signal_strength: Optional[float],
+                 location: Any, fish_species: Optional[str], created_at: datetime):
+        self.id = id
+        self.pond_id = pond_id
+        self.device_id = device_id
+        self.timestamp = timestamp
+        self.temperature = temperature
+        self.ph = ph
+        self.dissolved_oxygen = dissolved_oxygen
+        self.turbidity = turbidity
+        self.ammonia = ammonia
+        self.nitrite = nitrite
+        self.nitrate = nitrate
+        self.salinity = salinity
+        self.water_level = water_level
+        self.data_quality = data_quality
+        self.battery_level = battery_level
+        self.signal_strength = signal_strength
+        self.location = location
+        self.fish_species = fish_species
+        self.created_at = created_at
+        self.validation_errors: List[str] = []
+        self.is_anomaly = False
+        self.anomaly_score = 0.0
+        self.anomaly_reasons: List[str] = []
+
+    def to_mongo(self) -> Dict[str, Any]:
+        """The stored document: MONGO_FIELDS only"""
+        return dict(zip(MONGO_FIELDS, _mongo_values(self)))
+
+
+class PondHistory:
+    """Recent readings of one pond, stored as parallel columns"""
+    __slots__ = ("timestamps", "temperature", "ph", "dissolved_oxygen")
+
+    def __init__(self):
+        self.timestamps = deque(maxlen=HISTORY_SIZE)
+        self.temperature = deque(maxlen=HISTORY_SIZE)
+        self.ph = deque(maxlen=HISTORY_SIZE)
+        self.dissolved_oxygen = deque(maxlen=HISTORY_SIZE)
+
+    def append(self, timestamp: datetime, temperature, ph, dissolved_oxygen):
+        """Record a reading; missing values count as zero in the averages"""
+        self.timestamps.append(timestamp)
+        self.temperature.append(temperature or 0.0)
+        self.ph.append(ph or 0.0)
+        self.dissolved_oxygen.append(dissolved_oxygen or 0.0)
+
+    def window_means(self, cutoff: datetime):
+        """(temperature, ph, dissolved_oxygen) means of the last ANOMALY_WINDOW readings after cutoff"""
+        columns = (self.temperature, self.ph, self.dissolved_oxygen)
+        start = len(self.timestamps) - ANOMALY_WINDOW
+        if start < 0:
+            return None
+        if min(itertools.islice(self.timestamps, start, None)) > cutoff:
+            # Usual case: the newest readings are all recent, so they are the window
+            return tuple(sum(itertools.islice(column, start, None)) / ANOMALY_WINDOW for column in columns)
+        window = [i for i, timestamp in enumerate(self.timestamps) if timestamp > cutoff][-ANOMALY_WINDOW:]
+        if len(window) < ANOMALY_WINDOW:
+            return None
+        return tuple(sum(column[i] for i in window) / ANOMALY_WINDOW for column in columns)
+
 class BackendMonitor:
     def __init__(self, broker_host="broker.hivemq.com", broker_port=1883):
         self.broker_host = broker_host
         self.broker_port = broker_port
         self.client = None
         self.is_connected = False
+        # Set by on_connect, so connect() wakes as soon as the broker accepts
+        self._connected_evt = threading.Event()
         
         # MongoDB connection
         self.mongo_client = None
         self.db = None
         self.sensor_collection = None
         
+        # Readings waiting for the next insert_many; the MQTT thread and the flush timer share it
+        self._mongo_buffer: List[Dict[str, Any]] = []
+        self._mongo_buffer_lock = threading.Lock()
+        self._mongo_flush_timer = None
+        
         # In-memory storage for demonstration
-        self.data_store = []  # Simulate database
-        self.alerts = []      # Simulate alerts collection
+        # pond_id -> its latest readings, with UTC-aware timestamps
+        self._history: Dict[str, PondHistory] = defaultdict(PondHistory)
+        self._reading_ids = itertools.count(1)
+        self.total_readings = 0
+        self.alerts: deque = deque(maxlen=ALERT_HISTORY_SIZE)  # Simulate alerts collection
+        self._alert_ids = itertools.count(1)
+        self.total_alerts = 0
         self.device_status = {}  # Track device status
         
+        # paho's callback only enqueues; one worker thread does the processing
+        self._ingest_q: queue.Queue = queue.Queue(maxsize=INGEST_QUEUE_SIZE)
+        self._worker = threading.Thread(target=self._drain, name="backend-monitor-worker", daemon=True)
+        self._worker.start()
+        
+        # First topic level -> handler(topic levels, data)
+        self._routes = {
+            "farm1": self._route_farm,
+            "sensors": self._route_sensors,
+            "status": self.process_status_update_sync,
+            "commands": self.process_command_sync,
+        }
+        
         self.setup_database()
         self.setup_mqtt()
     
@@ -47,13 +289,35 @@ class BackendMonitor:
         """Setup MongoDB connection"""
         try:
             # Connect to MongoDB
-            self.mongo_client = MongoClient('mongodb://localhost:27017/')
-            self.db = self.mongo_client['ocea']
-            self.sensor_collection = self.db['sensor_readings']
+            self.mongo_client = get_mongo_client()
+            self.db = self.mongo_client.get_database('ocea', codec_options=_CODEC_OPTIONS)
+            # Telemetry inserts are fire-and-forget (w=0): a reading lost to a server
+            # failure is acceptable, waiting on an acknowledgement per batch is not
+            self.sensor_collection = self.db.get_collection(
+                'sensor_readings', write_concern=WriteConcern(w=0)
+            )
             logger.info("✅ Connected to MongoDB database")
         except Exception as e:
             logger.error(f"❌ Failed to connect to MongoDB: {e}")
             self.mongo_client = None
+            return
+        self.ensure_indexes()
+    
+    def ensure_indexes(self):
+        """Create the indexes behind per-pond and per-device reading queries"""
+        try:
+            # Acknowledged, unlike the telemetry inserts, so failures are reported
+            collection = self.db['sensor_readings']
+            # Latest/ranged readings per pond
+            collection.create_index([('pond_id', ASCENDING), ('timestamp', DESCENDING)])
+            collection.create_index('device_id')
+            # Self-pruning instead of growing without bound
+            collection.create_index(
+                'created_at', expireAfterSeconds=READING_RETENTION_DAYS * 86400
+            )
+            logger.info("🗂️ MongoDB indexes ensured")
+        except Exception as e:
+            logger.error(f"❌ Failed to create MongoDB indexes: {e}")
     
     def setup_mqtt(self):
         """Setup MQTT client"""
@@ -62,7 +326,12 @@ class BackendMonitor:
     def setup_client(self):
         """Setup MQTT client"""
         # Use the simple old API for compatibility
-        self.client = mqtt.Client(client_id=f"backend_monitor_{int(datetime.now().timestamp())}")
+        self.client = mqtt.Client(
+            client_id=f"backend_monitor_{int(datetime.now().timestamp())}",
+            clean_session=True
+        )
+        self.client.max_inflight_messages_set(MQTT_MAX_INFLIGHT)
+        self.client.max_queued_messages_set(MQTT_MAX_QUEUED)
         
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
@@ -73,14 +342,27 @@ class BackendMonitor:
         if rc == 0:
             logger.info(f"✅ Backend connected to MQTT broker at {self.broker_host}:{self.broker_port}")
             self.is_connected = True
+            self._connected_evt.set()
+            self.tune_socket()
             self.subscribe_to_topics()
         else:
             logger.error(f"❌ Failed to connect to MQTT broker. Reason: {rc}")
     
+    def tune_socket(self):
+        """Enlarge the receive buffer of the broker socket; runs on every (re)connect"""
+        sock = self.client.socket()
+        if sock is None:
+            return
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, MQTT_RCVBUF_BYTES)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not raise MQTT socket receive buffer: {e}")
+    
     def on_disconnect(self, client, userdata, rc):
         """Callback when disconnected - compatible with old paho-mqtt"""
         logger.info(f"🔌 Backend disconnected from MQTT broker")
         self.is_connected = False
+        self._connected_evt.clear()
     
     def subscribe_to_topics(self):
         """Subscribe to all relevant topics"""
@@ -97,65 +379,38 @@ class BackendMonitor:
             logger.info(f"🔔 Subscribed to topic: {topic}")
     
     def on_message(self, client, userdata, msg):
-        """Process incoming MQTT messages"""
+        """Hand incoming MQTT messages to the worker without blocking the network loop"""
+        try:
+            self._ingest_q.put_nowait((msg.topic, msg.payload))
+        except queue.Full:
+            logger.warning("⚠️ Ingest queue full, dropping message on %s", msg.topic)
+    
+    def _drain(self):
+        """Worker loop: process queued messages until the None sentinel arrives"""
+        while True:
+            item = self._ingest_q.get()
+            if item is None:
+                break
+            self.handle_message(*item)
+    
+    def handle_message(self, topic: str, payload: bytes):
+        """Process an incoming MQTT message"""
         try:
-            topic = msg.topic
-            payload = msg.payload.decode('utf-8')
-            
             # Skip empty or invalid messages
             if not payload or len(payload) < 2:
                 return
                 
-            data = json.loads(payload)
+            # Parsed straight from bytes; orjson's decode error subclasses json.JSONDecodeError
+            data = _decode_payload(payload)
             
-            logger.info(f"📨 Received message on topic '{topic}'")
+            logger.debug("📨 Received message on topic '%s'", topic)
             
-            # Route message based on topic - run synchronously to avoid event loop issues
-            if topic.startswith("farm1/") and topic.endswith("/data"):
-                # Legacy pond data format
-                pond_id = topic.split('/')[1]
-                # Run synchronously
-                try:
-                    loop = asyncio.get_event_loop()
-                    if loop.is_running():
-                        # Create a task if loop is running
-                        asyncio.create_task(self.process_pond_data(pond_id, data))
-                    else:
-                        # Run synchronously if no loop is running
-                        loop.run_until_complete(self.process_pond_data(pond_id, data))
-                except RuntimeError:
-                    # No event loop, create a new one
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    loop.run_until_complete(self.process_pond_data(pond_id, data))
-                    loop.close()
-            
-            elif topic == "sensors/water_quality":
-                # New water quality format
-                pond_id = data.get('pond_id', 'unknown')
-                try:
-                    loop = asyncio.get_event_loop()
-                    if loop.is_running():
-                        asyncio.create_task(self.process_pond_data(pond_id, data))
-                    else:
-                        loop.run_until_complete(self.process_pond_data(pond_id, data))
-                except RuntimeError:
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    loop.run_until_complete(self.process_pond_data(pond_id, data))
-                    loop.close()
-            
-            elif topic.startswith("sensors/"):
-                # Other sensor data - handle synchronously
-                self.process_sensor_data_sync(topic, data)
-            
-            elif topic.startswith("status/"):
-                # Device status updates - handle synchronously
-                self.process_status_update_sync(topic, data)
-            
-            elif topic.startswith("commands/"):
-                # Device commands - handle synchronously
-                self.process_command_sync(topic, data)
+            # Route message on its first topic level; the worker thread runs everything synchronously
+            # The topic is split once; handlers get its levels instead of re-splitting
+            parts = topic.split('/')
+            handler = self._routes.get(parts[0])
+            if handler is not None:
+                handler(parts, data)
             
         except json.JSONDecodeError as e:
             # Skip invalid JSON from other clients on public broker
@@ -164,78 +419,79 @@ class BackendMonitor:
         except Exception as e:
             logger.error(f"❌ Error processing MQTT message: {e}")
     
-    async def process_pond_data(self, pond_id: str, data: Dict[str, Any]):
-        """Process comprehensive pond sensor data"""
+    def _route_farm(self, parts: List[str], data: Dict[str, Any]):
+        """Legacy pond data format: farm1/<pond_id>/data"""
+        if len(parts) > 1 and parts[-1] == "data":
+            self.process_pond_data_sync(parts[1], data)
+    
+    def _route_sensors(self, parts: List[str], data: Dict[str, Any]):
+        """sensors/water_quality carries pond data; other sensors are handled individually"""
+        if len(parts) == 2 and parts[1] == "water_quality":
+            self.process_pond_data_sync(data.get('pond_id', 'unknown'), data)
+        else:
+            self.process_sensor_data_sync(parts, data)
+    
+    def process_pond_data_sync(self, pond_id: str, data: Dict[str, Any]):
+        """Process comprehensive pond sensor data synchronously"""
         try:
-            logger.info(f"🏊 Processing pond data for {pond_id}")
+            logger.info("🏊 Processing pond data for %s", pond_id)
+            # One clock read for the whole pipeline
+            now = datetime.now(timezone.utc)
             
-            # Extract timestamp
+            # Extract timestamp; naive device timestamps are UTC
             timestamp_str = data.get('timestamp')
             if timestamp_str:
-                timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+                timestamp = _parse_timestamp(timestamp_str)
+                if timestamp.tzinfo is None:
+                    timestamp = timestamp.replace(tzinfo=timezone.utc)
             else:
-                timestamp = datetime.utcnow()
+                timestamp = now
             
             # Create sensor reading record
-            sensor_reading = {
-                'id': f"reading_{len(self.data_store) + 1}",
-                'pond_id': pond_id,
-                'device_id': data.get('device_id'),
-                'timestamp': timestamp,
-                'temperature': data.get('temperature'),
-                'ph': data.get('ph'),
-                'dissolved_oxygen': data.get('dissolved_oxygen'),
-                'turbidity': data.get('turbidity'),
-                'ammonia': data.get('ammonia'),
-                'nitrite': data.get('nitrite'),
-                'nitrate': data.get('nitrate'),
-                'salinity': data.get('salinity'),
-                'water_level': data.get('water_level'),
-                'data_quality': data.get('data_quality', 'good'),
-                'battery_level': data.get('battery_level'),
-                'signal_strength': data.get('signal_strength'),
-                'location': data.get('location'),
-                'fish_species': data.get('fish_species'),
-                'created_at': datetime.utcnow()
-            }
+            sensor_reading = SensorReading(
+                id=f"reading_{next(self._reading_ids)}",
+                pond_id=pond_id,
+                device_id=data.get('device_id'),
+                timestamp=timestamp,
+                temperature=data.get('temperature'),
+                ph=data.get('ph'),
+                dissolved_oxygen=data.get('dissolved_oxygen'),
+                turbidity=data.get('turbidity'),
+                ammonia=data.get('ammonia'),
+                nitrite=data.get('nitrite'),
+                nitrate=data.get('nitrate'),
+                salinity=data.get('salinity'),
+                water_level=data.get('water_level'),
+                data_quality=data.get('data_quality', 'good'),
+                battery_level=data.get('battery_level'),
+                signal_strength=data.get('signal_strength'),
+                location=data.get('location'),
+                fish_species=data.get('fish_species'),
+                created_at=now
+            )
             
             # Validate data
             validation_errors = self.validate_sensor_data(sensor_reading)
             if validation_errors:
-                logger.warning(f"⚠️ Validation errors for {pond_id}: {validation_errors}")
-                sensor_reading['validation_errors'] = validation_errors
-            
-            # Store in simulated database
-            self.data_store.append(sensor_reading)
-            logger.info(f"💾 Stored sensor reading #{sensor_reading['id']} for pond {pond_id}")
+                logger.warning("⚠️ Validation errors for %s: %s", pond_id, validation_errors)
+                sensor_reading.validation_errors = validation_errors
+            
+            # Keep just what anomaly detection needs
+            self.total_readings += 1
+            self._history[pond_id].append(
+                timestamp,
+                sensor_reading.temperature,
+                sensor_reading.ph,
+                sensor_reading.dissolved_oxygen
+            )
+            logger.info("💾 Stored sensor reading #%s for pond %s", sensor_reading.id, pond_id)
             
             # Store in real MongoDB database
             if self.mongo_client is not None and self.sensor_collection is not None:
                 try:
-                    # Convert datetime objects to ISO strings for MongoDB
-                    mongo_record = {
-                        'pond_id': pond_id,
-                        'device_id': sensor_reading.get('device_id'),
-                        'timestamp': sensor_reading['timestamp'],
-                        'temperature': sensor_reading.get('temperature'),
-                        'ph': sensor_reading.get('ph'),
-                        'dissolved_oxygen': sensor_reading.get('dissolved_oxygen'),
-                        'turbidity': sensor_reading.get('turbidity'),
-                        'ammonia': sensor_reading.get('ammonia'),
-                        'nitrite': sensor_reading.get('nitrite'),
-                        'nitrate': sensor_reading.get('nitrate'),
-                        'salinity': sensor_reading.get('salinity'),
-                        'water_level': sensor_reading.get('water_level'),
-                        'data_quality': sensor_reading.get('data_quality'),
-                        'battery_level': sensor_reading.get('battery_level'),
-                        'signal_strength': sensor_reading.get('signal_strength'),
-                        'location': sensor_reading.get('location'),
-                        'fish_species': sensor_reading.get('fish_species'),
-                        'created_at': sensor_reading['created_at']
-                    }
-                    
-                    result = self.sensor_collection.insert_one(mongo_record)
-                    logger.info(f"🗄️ Stored in MongoDB with ID: {result.inserted_id}")
+                    # A projection rather than the reading itself: anomaly detection keeps
+                    # mutating the reading while the flush timer may be encoding the batch
+                    self.buffer_mongo_record(sensor_reading.to_mongo())
                     
                 except Exception as e:
                     logger.error(f"❌ Failed to store in MongoDB: {e}")
@@ -243,10 +499,10 @@ class BackendMonitor:
                 logger.warning("⚠️ MongoDB not available, storing only in memory")
             
             # Perform anomaly detection
-            await self.perform_anomaly_detection(sensor_reading)
+            self.perform_anomaly_detection(sensor_reading, now)
             
             # Check for critical conditions
-            await self.check_critical_conditions(sensor_reading)
+            self.check_critical_conditions(sensor_reading, now)
             
             # Log data summary
             self.log_data_summary(sensor_reading)
@@ -254,32 +510,70 @@ class BackendMonitor:
         except Exception as e:
             logger.error(f"❌ Error processing pond data for {pond_id}: {e}")
     
-    def process_sensor_data_sync(self, topic: str, data: Dict[str, Any]):
+    def buffer_mongo_record(self, record: Dict[str, Any]):
+        """Queue a record for the next batched MongoDB insert"""
+        with self._mongo_buffer_lock:
+            self._mongo_buffer.append(record)
+            if len(self._mongo_buffer) >= MONGO_BATCH_SIZE:
+                batch = self._take_mongo_buffer()
+            else:
+                batch = None
+                if self._mongo_flush_timer is None:
+                    self._mongo_flush_timer = threading.Timer(MONGO_FLUSH_INTERVAL, self.flush_mongo_buffer)
+                    self._mongo_flush_timer.daemon = True
+                    self._mongo_flush_timer.start()
+        if batch:
+            self.write_mongo_batch(batch)
+    
+    def _take_mongo_buffer(self) -> List[Dict[str, Any]]:
+        """Swap out the buffered records and disarm the flush timer; caller holds the lock"""
+        batch, self._mongo_buffer = self._mongo_buffer, []
+        if self._mongo_flush_timer is not None:
+            self._mongo_flush_timer.cancel()
+            self._mongo_flush_timer = None
+        return batch
+    
+    def flush_mongo_buffer(self):
+        """Write out whatever is buffered"""
+        with self._mongo_buffer_lock:
+            batch = self._take_mongo_buffer()
+        if batch:
+            self.write_mongo_batch(batch)
+    
+    def write_mongo_batch(self, batch: List[Dict[str, Any]]):
+        """Insert a batch of records; unordered so one bad document doesn't stop the rest"""
+        try:
+            self.sensor_collection.insert_many(batch, ordered=False)
+            logger.info("🗄️ Sent %d readings to MongoDB", len(batch))
+        except Exception as e:
+            logger.error(f"❌ Failed to store {len(batch)} readings in MongoDB: {e}")
+    
+    def process_sensor_data_sync(self, parts: List[str], data: Dict[str, Any]):
         """Process other sensor data synchronously"""
         try:
-            sensor_type = topic.split('/')[-1]
+            sensor_type = parts[-1]
             device_id = data.get('device_id', 'unknown')
             
-            logger.info(f"📡 Processing {sensor_type} data from {device_id}")
+            logger.info("📡 Processing %s data from %s", sensor_type, device_id)
             
             # For temperature sensors, check if it's too extreme
             if sensor_type == 'temperature':
                 temp = data.get('temperature')
                 if temp and (temp < 0 or temp > 50):
-                    logger.warning(f"⚠️ Extreme temperature reading: {temp}°C from {device_id}")
+                    logger.warning("⚠️ Extreme temperature reading: %s°C from %s", temp, device_id)
             
         except Exception as e:
             logger.error(f"❌ Error processing sensor data: {e}")
     
-    def process_status_update_sync(self, topic: str, data: Dict[str, Any]):
+    def process_status_update_sync(self, parts: List[str], data: Dict[str, Any]):
         """Process device status updates synchronously"""
         try:
-            status_type = topic.split('/')[-1]
+            status_type = parts[-1]
             device_id = data.get('device_id', 'unknown')
             
             # Update device status
             self.device_status[device_id] = {
-                'last_seen': datetime.utcnow(),
+                'last_seen': datetime.now(timezone.utc),
                 'status': data.get('status', 'unknown'),
                 'uptime': data.get('uptime'),
                 'memory_usage': data.get('memory_usage'),
@@ -287,16 +581,16 @@ class BackendMonitor:
                 'network_quality': data.get('network_quality')
             }
             
-            logger.info(f"📊 Updated status for {device_id}: {data.get('status', 'unknown')}")
+            logger.info("📊 Updated status for %s: %s", device_id, data.get('status', 'unknown'))
             
         except Exception as e:
             logger.error(f"❌ Error processing status update: {e}")
     
-    def process_command_sync(self, topic: str, data: Dict[str, Any]):
+    def process_command_sync(self, parts: List[str], data: Dict[str, Any]):
         """Process device commands synchronously"""
         try:
-            command_type = topic.split('/')[-1]
-            logger.info(f"📋 Processing command: {command_type} - {data}")
+            command_type = parts[-1]
+            logger.info("📋 Processing command: %s - %s", command_type, data)
             
         except Exception as e:
             logger.error(f"❌ Error processing command: {e}")
@@ -315,14 +609,14 @@ class BackendMonitor:
                 'sensor_type': sensor_type,
                 'device_id': device_id,
                 'data': data,
-                'timestamp': datetime.utcnow()
+                'timestamp': datetime.now(timezone.utc)
             }
             
             # For temperature sensors, check if it's too extreme
             if sensor_type == 'temperature':
                 temp = data.get('temperature')
                 if temp and (temp < 0 or temp > 50):
-                    await self.create_alert(device_id, 'temperature_extreme', 
+                    self.create_alert(device_id, 'temperature_extreme', 
                                           f'Extreme temperature reading: {temp}°C', 'high')
             
         except Exception as e:
@@ -336,7 +630,7 @@ class BackendMonitor:
             
             # Update device status
             self.device_status[device_id] = {
-                'last_seen': datetime.utcnow(),
+                'last_seen': datetime.now(timezone.utc),
                 'status': data.get('status', 'unknown'),
                 'uptime': data.get('uptime'),
                 'memory_usage': data.get('memory_usage'),
@@ -364,7 +658,7 @@ class BackendMonitor:
                 'topic': topic,
                 'command_type': command_type,
                 'data': data,
-                'timestamp': datetime.utcnow()
+                'timestamp': datetime.now(timezone.utc)
             }
             
             # In a real system, you might store commands in database
@@ -373,136 +667,96 @@ class BackendMonitor:
         except Exception as e:
             logger.error(f"❌ Error processing command: {e}")
     
-    def validate_sensor_data(self, reading: Dict[str, Any]) -> List[str]:
+    def validate_sensor_data(self, reading: SensorReading) -> List[str]:
         """Validate sensor data against expected ranges"""
         errors = []
         
         # Check temperature
-        temp = reading.get('temperature')
+        temp = reading.temperature
         if temp is not None:
             if temp < -20 or temp > 60:
                 errors.append(f"Temperature out of expected range: {temp}°C")
         
         # Check pH
-        ph = reading.get('ph')
+        ph = reading.ph
         if ph is not None:
             if ph < 0 or ph > 14:
                 errors.append(f"pH out of valid range: {ph}")
         
         # Check dissolved oxygen
-        do = reading.get('dissolved_oxygen')
+        do = reading.dissolved_oxygen
         if do is not None:
             if do < 0 or do > 25:
                 errors.append(f"Dissolved oxygen out of expected range: {do} mg/L")
         
         # Check ammonia
-        ammonia = reading.get('ammonia')
+        ammonia = reading.ammonia
         if ammonia is not None:
             if ammonia < 0 or ammonia > 2:
                 errors.append(f"Ammonia out of expected range: {ammonia} mg/L")
         
         return errors
     
-    async def perform_anomaly_detection(self, reading: Dict[str, Any]):
+    def perform_anomaly_detection(self, reading: SensorReading, now: datetime):
         """Simulate anomaly detection"""
         try:
-            pond_id = reading['pond_id']
+            pond_id = reading.pond_id
             anomaly_score = 0.0
             reasons = []
             
             # Simple anomaly detection logic
             # In a real system, this would use ML models
             
-            # Check against recent historical data
-            recent_readings = []
-            cutoff_time = datetime.utcnow() - timedelta(hours=24)
-            for r in self.data_store:
-                if r['pond_id'] == pond_id:
-                    # Handle both naive and aware datetimes
-                    reading_time = r['timestamp']
-                    if hasattr(reading_time, 'tzinfo') and reading_time.tzinfo is not None:
-                        # Convert aware datetime to naive for comparison
-                        reading_time = reading_time.replace(tzinfo=None)
-                    if reading_time > cutoff_time:
-                        recent_readings.append(r)
-            
-            if len(recent_readings) >= 5:
-                # Calculate averages
-                avg_temp = sum(r['temperature'] for r in recent_readings[-5:] if r['temperature']) / 5
-                avg_ph = sum(r['ph'] for r in recent_readings[-5:] if r['ph']) / 5
-                avg_do = sum(r['dissolved_oxygen'] for r in recent_readings[-5:] if r['dissolved_oxygen']) / 5
+            # Check against recent historical data for this pond only
+            cutoff_time = now - timedelta(hours=24)
+            means = self._history[pond_id].window_means(cutoff_time)
+            
+            if means is not None:
+                avg_temp, avg_ph, avg_do = means
                 
                 # Check for significant deviations
-                if reading['temperature'] and abs(reading['temperature'] - avg_temp) > 5:
+                if reading.temperature and abs(reading.temperature - avg_temp) > 5:
                     anomaly_score += 0.3
-                    reasons.append(f"Temperature deviation: {reading['temperature']}°C vs avg {avg_temp:.1f}°C")
+                    reasons.append(f"Temperature deviation: {reading.temperature}°C vs avg {avg_temp:.1f}°C")
                 
-                if reading['ph'] and abs(reading['ph'] - avg_ph) > 1:
+                if reading.ph and abs(reading.ph - avg_ph) > 1:
                     anomaly_score += 0.4
-                    reasons.append(f"pH deviation: {reading['ph']} vs avg {avg_ph:.1f}")
+                    reasons.append(f"pH deviation: {reading.ph} vs avg {avg_ph:.1f}")
                 
-                if reading['dissolved_oxygen'] and abs(reading['dissolved_oxygen'] - avg_do) > 3:
+                if reading.dissolved_oxygen and abs(reading.dissolved_oxygen - avg_do) > 3:
                     anomaly_score += 0.5
-                    reasons.append(f"DO deviation: {reading['dissolved_oxygen']} mg/L vs avg {avg_do:.1f} mg/L")
+                    reasons.append(f"DO deviation: {reading.dissolved_oxygen} mg/L vs avg {avg_do:.1f} mg/L")
             
             # Update reading with anomaly info
-            reading['is_anomaly'] = anomaly_score > 0.5
-            reading['anomaly_score'] = anomaly_score
-            reading['anomaly_reasons'] = reasons
+            reading.is_anomaly = anomaly_score > 0.5
+            reading.anomaly_score = anomaly_score
+            reading.anomaly_reasons = reasons
             
-            if reading['is_anomaly']:
-                logger.warning(f"🔍 Anomaly detected for pond {pond_id}: Score={anomaly_score:.2f}, Reasons={reasons}")
-                await self.create_alert(pond_id, 'anomaly', f"Anomaly detected: {', '.join(reasons)}", 'medium')
+            if reading.is_anomaly:
+                logger.warning("🔍 Anomaly detected for pond %s: Score=%.2f, Reasons=%s", pond_id, anomaly_score, reasons)
+                self.create_alert(pond_id, 'anomaly', f"Anomaly detected: {', '.join(reasons)}", 'medium', now)
             
         except Exception as e:
             logger.error(f"❌ Error in anomaly detection: {e}")
     
-    async def check_critical_conditions(self, reading: Dict[str, Any]):
+    def check_critical_conditions(self, reading: SensorReading, now: datetime):
         """Check for critical water quality conditions"""
         try:
-            pond_id = reading['pond_id']
-            alerts = []
-            
-            # Check dissolved oxygen
-            do = reading.get('dissolved_oxygen')
-            if do is not None:
-                if do < self.thresholds['dissolved_oxygen']['critical_min']:
-                    alerts.append(('critical_oxygen', f'Critical low dissolved oxygen: {do} mg/L', 'critical'))
-                elif do < self.thresholds['dissolved_oxygen']['min']:
-                    alerts.append(('low_oxygen', f'Low dissolved oxygen: {do} mg/L', 'high'))
-            
-            # Check temperature
-            temp = reading.get('temperature')
-            if temp is not None:
-                if temp < self.thresholds['temperature']['critical_min'] or temp > self.thresholds['temperature']['critical_max']:
-                    alerts.append(('temperature_extreme', f'Extreme temperature: {temp}°C', 'critical'))
-                elif temp < self.thresholds['temperature']['min'] or temp > self.thresholds['temperature']['max']:
-                    alerts.append(('temperature_warning', f'Temperature out of range: {temp}°C', 'high'))
-            
-            # Check pH
-            ph = reading.get('ph')
-            if ph is not None:
-                if ph < self.thresholds['ph']['critical_min'] or ph > self.thresholds['ph']['critical_max']:
-                    alerts.append(('ph_extreme', f'Extreme pH level: {ph}', 'critical'))
-                elif ph < self.thresholds['ph']['min'] or ph > self.thresholds['ph']['max']:
-                    alerts.append(('ph_warning', f'pH out of optimal range: {ph}', 'high'))
-            
-            # Check ammonia
-            ammonia = reading.get('ammonia')
-            if ammonia is not None:
-                if ammonia > self.thresholds['ammonia']['critical_max']:
-                    alerts.append(('ammonia_critical', f'Critical ammonia level: {ammonia} mg/L', 'critical'))
-                elif ammonia > self.thresholds['ammonia']['max']:
-                    alerts.append(('ammonia_high', f'High ammonia level: {ammonia} mg/L', 'high'))
-            
-            # Check battery level
-            battery = reading.get('battery_level')
-            if battery is not None and battery < 15:
-                alerts.append(('low_battery', f'Low device battery: {battery}%', 'medium'))
-            
-            # Create alerts
-            for alert_type, message, severity in alerts:
-                await self.create_alert(pond_id, alert_type, message, severity)
+            pond_id = reading.pond_id
+            
+            # One range test per level, driven by the rule table
+            for parameter, crit_low, crit_high, low, high, critical, warning in _CONDITION_RULES:
+                value = getattr(reading, parameter)
+                if value is None:
+                    continue
+                if not crit_low <= value <= crit_high:
+                    alert = critical
+                elif not low <= value <= high:
+                    alert = warning
+                else:
+                    continue
+                alert_type, template, severity = alert
+                self.create_alert(pond_id, alert_type, template.format(value), severity, now)
             
         except Exception as e:
             logger.error(f"❌ Error checking critical conditions: {e}")
@@ -513,52 +767,53 @@ class BackendMonitor:
             # Check memory usage
             memory_usage = heartbeat_data.get('memory_usage')
             if memory_usage and memory_usage > 90:
-                await self.create_alert(device_id, 'high_memory', f'High memory usage: {memory_usage}%', 'medium')
+                self.create_alert(device_id, 'high_memory', f'High memory usage: {memory_usage}%', 'medium')
             
             # Check network quality
             network_quality = heartbeat_data.get('network_quality')
             if network_quality == 'poor':
-                await self.create_alert(device_id, 'poor_network', 'Poor network quality detected', 'medium')
+                self.create_alert(device_id, 'poor_network', 'Poor network quality detected', 'medium')
             
             logger.info(f"💓 Device {device_id} health check completed")
             
         except Exception as e:
             logger.error(f"❌ Error checking device health: {e}")
     
-    async def create_alert(self, pond_id: str, alert_type: str, message: str, severity: str):
-        """Create an alert"""
+    def create_alert(self, pond_id: str, alert_type: str, message: str, severity: str,
+                     now: Optional[datetime] = None):
+        """Create an alert, stamped with the caller's clock reading when given"""
         try:
             alert = {
-                'id': f"alert_{len(self.alerts) + 1}",
+                'id': f"alert_{next(self._alert_ids)}",
                 'pond_id': pond_id,
                 'alert_type': alert_type,
                 'severity': severity,
                 'title': f"Alert - Pond {pond_id}",
                 'message': message,
-                'timestamp': datetime.utcnow(),
+                'timestamp': now or datetime.now(timezone.utc),
                 'status': 'active'
             }
             
             self.alerts.append(alert)
+            self.total_alerts += 1
             
             # Log alert with appropriate emoji
-            emoji = {'critical': '🚨', 'high': '⚠️', 'medium': '📢', 'low': '📝'}
-            logger.warning(f"{emoji.get(severity, '📢')} {severity.upper()} ALERT: {message}")
+            logger.warning("%s %s ALERT: %s", _ALERT_EMOJI.get(severity, '📢'), severity.upper(), message)
             
         except Exception as e:
             logger.error(f"❌ Error creating alert: {e}")
     
-    def log_data_summary(self, reading: Dict[str, Any]):
+    def log_data_summary(self, reading: SensorReading):
         """Log summary of sensor data"""
         try:
-            pond_id = reading['pond_id']
-            temp = reading.get('temperature', 'N/A')
-            ph = reading.get('ph', 'N/A')
-            do = reading.get('dissolved_oxygen', 'N/A')
-            ammonia = reading.get('ammonia', 'N/A')
-            battery = reading.get('battery_level', 'N/A')
-            
-            logger.info(f"📊 POND {pond_id} Summary: Temp={temp}°C, pH={ph}, DO={do}mg/L, NH3={ammonia}mg/L, Battery={battery}%")
+            # Skip building the summary at all when INFO is filtered out
+            if not logger.isEnabledFor(logging.INFO):
+                return
+            logger.info(
+                "📊 POND %s Summary: Temp=%s°C, pH=%s, DO=%smg/L, NH3=%smg/L, Battery=%s%%",
+                reading.pond_id, reading.temperature, reading.ph,
+                reading.dissolved_oxygen, reading.ammonia, reading.battery_level
+            )
             
         except Exception as e:
             logger.error(f"❌ Error logging data summary: {e}")
@@ -566,15 +821,14 @@ class BackendMonitor:
     def print_statistics(self):
         """Print system statistics"""
         try:
-            total_readings = len(self.data_store)
-            total_alerts = len(self.alerts)
+            total_readings = self.total_readings
+            total_alerts = self.total_alerts
             active_devices = len(self.device_status)
+            # Snapshot: the worker thread keeps appending, and deques can't be iterated while mutated
+            alerts = list(self.alerts)
             
             # Count alerts by severity
-            alert_counts = {}
-            for alert in self.alerts:
-                severity = alert['severity']
-                alert_counts[severity] = alert_counts.get(severity, 0) + 1
+            alert_counts = dict(Counter(alert['severity'] for alert in alerts))
             
             print(f"\n📈 SYSTEM STATISTICS:")
             print(f"   Total sensor readings: {total_readings}")
@@ -583,7 +837,8 @@ class BackendMonitor:
             print(f"   Alerts by severity: {alert_counts}")
             
             # Show recent alerts
-            recent_alerts = [a for a in self.alerts if a['timestamp'] > datetime.utcnow() - timedelta(minutes=5)]
+            recent_cutoff = datetime.now(timezone.utc) - timedelta(minutes=5)
+            recent_alerts = [a for a in alerts if a['timestamp'] > recent_cutoff]
             if recent_alerts:
                 print(f"\n🔔 RECENT ALERTS (last 5 minutes):")
                 for alert in recent_alerts[-5:]:
@@ -602,16 +857,11 @@ class BackendMonitor:
             self.client.loop_start()
             
             # Wait for connection with timeout
-            timeout = 10  # seconds
-            start_time = time.time()
-            while not self.is_connected and (time.time() - start_time) < timeout:
-                time.sleep(0.1)
-            
-            if self.is_connected:
+            if self._connected_evt.wait(timeout=MQTT_CONNECT_TIMEOUT):
                 logger.info("✅ Connection established successfully!")
                 return True
             else:
-                logger.error("❌ Connection timeout - failed to connect within 10 seconds")
+                logger.error(f"❌ Connection timeout - failed to connect within {MQTT_CONNECT_TIMEOUT} seconds")
                 return False
                 
         except Exception as e:
@@ -623,11 +873,7 @@ class BackendMonitor:
                 self.client.connect(self.broker_host, self.broker_port, 60)
                 self.client.loop_start()
                 
-                start_time = time.time()
-                while not self.is_connected and (time.time() - start_time) < timeout:
-                    time.sleep(0.1)
-                
-                if self.is_connected:
+                if self._connected_evt.wait(timeout=MQTT_CONNECT_TIMEOUT):
                     logger.info("✅ Connected to alternative broker!")
                     return True
                 else:
@@ -644,9 +890,13 @@ class BackendMonitor:
             self.client.disconnect()
             logger.info("� Disconnected from MQTT broker")
         
+        # Let the worker finish what was already received
+        self._ingest_q.put(None)
+        self._worker.join(timeout=5)
+        
+        # The client itself is shared; close_mongo_client() releases it
         if self.mongo_client:
-            self.mongo_client.close()
-            logger.info("🗄️ Closed MongoDB connection")
+            self.flush_mongo_buffer()
         
         logger.info("👋 Backend monitor stopped")
 
@@ -676,7 +926,7 @@ async def main():
             monitor.print_statistics()
             
             # Check for offline devices
-            current_time = datetime.utcnow()
+            current_time = datetime.now(timezone.utc)
             for device_id, status in monitor.device_status.items():
                 last_seen = status['last_seen']
                 if (current_time - last_seen).seconds > 120:  # 2 minutes
@@ -686,6 +936,7 @@ async def main():
         logger.info("🛑 Backend monitor stopped by user")
     finally:
         monitor.disconnect()
+        close_mongo_client()
 
 if __name__ == "__main__":
     asyncio.run(main())
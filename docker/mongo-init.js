@@ -20,7 +20,9 @@ db.createCollection('users', {
 
 db.createCollection('farms');
 db.createCollection('ponds');
-db.createCollection('sensor_readings');
+db.createCollection('sensor_readings', {
+  timeseries: { timeField: 'timestamp', metaField: 'pond_id', granularity: 'seconds' }
+});
 db.createCollection('alerts');
 db.createCollection('system_logs');
 
@@ -1,12 +1,129 @@
+import asyncio
 import json
+import logging
+import struct
 import time
 import threading
 import random
-from datetime import datetime
+from datetime import datetime, timezone
 import paho.mqtt.client as mqtt
 
+logger = logging.getLogger(__name__)
+
+# orjson encodes the float-heavy readings several times faster; stdlib json is the fallback
+try:
+    import orjson
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_dumps(data):
+        return json.dumps(data).encode()
+    _json_loads = json.loads
+
+# uvloop (installed with uvicorn[standard]) runs the event loop faster; asyncio's own loop otherwise
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
+# NumPy draws all simulated readings in one call; the random module is the fallback
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# MessagePack payloads are smaller and cheaper to encode; JSON is used without it
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+# First bytes of a JSON document; MessagePack maps never start with these
+JSON_PAYLOAD_PREFIXES = frozenset(b'{[ \t\r\n')
+
+# Simulated reading fields: (name, low, high, decimal places)
+READING_RANGES = (
+    # Water quality parameters with realistic ranges
+    ("temperature", 18.0, 28.0, 2),  # °C - typical fish pond range
+    ("ph", 6.5, 8.5, 2),  # pH - optimal fish range
+    ("dissolved_oxygen", 5.0, 12.0, 2),  # mg/L - critical for fish
+    ("turbidity", 0.5, 25.0, 2),  # NTU - water clarity
+    ("ammonia", 0.0, 0.5, 3),  # mg/L - toxic to fish
+    ("nitrite", 0.0, 0.3, 3),  # mg/L - toxic intermediate
+    ("nitrate", 0.0, 40.0, 2),  # mg/L - end product
+    ("salinity", 0.0, 5.0, 2),  # ppt - for brackish ponds
+    ("water_level", 0.8, 2.5, 2),  # meters - pond depth
+    
+    # Additional environmental data
+    ("ambient_temperature", 15.0, 35.0, 2),  # °C
+    ("humidity", 40.0, 85.0, 2),  # %
+    ("light_intensity", 0, 100000, 0),  # lux
+    
+    # System status
+    ("battery_level", 20.0, 100.0, 1),  # %
+    ("signal_strength", -90, -30, 0),  # dBm
+    
+    # Data quality indicators
+    ("sensor_drift", 0.0, 5.0, 2),  # %
+)
+READING_KEYS = tuple(name for name, _, _, _ in READING_RANGES)
+
+# Realistic variations based on time of day: (name, daytime low, high, nighttime low, high)
+DIURNAL_ADJUSTMENTS = (
+    ("dissolved_oxygen", 0.5, 1.5, -0.8, -0.2),  # Higher O2 during day, lower at night
+    ("temperature", 1.0, 3.0, -2.0, -0.5),  # Warmer during day, cooler at night
+)
+
+# Realistic bounds the adjusted values are kept within
+READING_BOUNDS = {
+    "dissolved_oxygen": (0.0, 15.0),
+    "temperature": (0.0, 40.0),
+}
+
+
+def _msgpack_map_body(data):
+    """A dict packed as MessagePack, without its map header"""
+    packed = msgpack.packb(data, use_bin_type=True)
+    return packed[1:] if len(data) < 16 else packed[3:]
+
+# Nanosecond clock units used by iso_timestamp and the day/night cycle
+NS_PER_HOUR = 3_600_000_000_000
+US_PER_DAY = 86_400_000_000
+
+# (days since epoch, "YYYY-MM-DDT") for the last formatted timestamp
+_iso_day = (None, "")
+
+
+def iso_timestamp(now_ns):
+    """Format a time.time_ns() value like datetime.utcnow().isoformat() + 'Z', reusing the date part"""
+    global _iso_day
+    day, micros = divmod(now_ns // 1000, US_PER_DAY)
+    cached = _iso_day
+    if cached[0] != day:
+        cached = (day, datetime.fromtimestamp(day * 86400, timezone.utc).strftime('%Y-%m-%dT'))
+        _iso_day = cached
+    seconds, micros = divmod(micros, 1_000_000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return '%s%02d:%02d:%02d.%06dZ' % (cached[1], hours, minutes, seconds, micros)
+
+
+def create_client(client_id):
+    """Create a paho client for whichever callback API the installed version supports"""
+    # Fix for paho-mqtt 2.0+ - use the latest callback API version
+    try:
+        # For paho-mqtt 2.0+ - use VERSION2 (latest)
+        return mqtt.Client(client_id=client_id, callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    except (TypeError, AttributeError):
+        # For older versions of paho-mqtt
+        return mqtt.Client(client_id)
+
 class MQTTConnection:
-    def __init__(self, broker_host="192.168.217.25", broker_port=1883, client_id="device_1"):
+    def __init__(self, broker_host="192.168.217.25", broker_port=1883, client_id="device_1",
+                 payload_format="json", client=None):
         """
         Initialize MQTT connection
         
@@ -14,75 +131,127 @@ class MQTTConnection:
             broker_host: MQTT broker IP address (use your PC's IP or public broker)
             broker_port: MQTT broker port (default 1883)
             client_id: Unique identifier for this client
+            payload_format: "msgpack" or "json" for published dict payloads
+            client: Shared paho client owned by an MQTTConnectionPool (default: own client)
         """
         self.broker_host = broker_host
         self.broker_port = broker_port
         self.client_id = client_id
+        self.payload_format = payload_format if MSGPACK_AVAILABLE else "json"
         
-        # Fix for paho-mqtt 2.0+ - use the latest callback API version
-        try:
-            # For paho-mqtt 2.0+ - use VERSION2 (latest)
-            self.client = mqtt.Client(client_id=client_id, callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
-        except (TypeError, AttributeError):
-            # For older versions of paho-mqtt
-            self.client = mqtt.Client(client_id)
-        
-        # Set up callbacks
-        self.client.on_connect = self.on_connect
-        self.client.on_message = self.on_message
-        self.client.on_disconnect = self.on_disconnect
-        self.client.on_publish = self.on_publish
+        if client is None:
+            self.client = create_client(client_id)
+            
+            # Set up callbacks
+            self.client.on_connect = self.on_connect
+            self.client.on_message = self.on_message
+            self.client.on_disconnect = self.on_disconnect
+            # No on_publish callback: every message is QoS 0, so there is no ack to wait for
+        else:
+            # The pool owns the connection and its callbacks
+            self.client = client
         
         self.is_connected = False
         self.start_time = time.time()  # Track when the device started
         
+        # Message handlers by exact topic
+        self._handlers = {
+            "sensors/temperature": self.handle_temperature_data,
+            "commands/device": self.handle_device_command,
+            "status/heartbeat": self.handle_heartbeat,
+        }
+        
+        # Bounds and rounding scale for drawing every reading field at once
+        if NUMPY_AVAILABLE:
+            self._rng = np.random.default_rng()
+            self._lo = np.array([lo for _, lo, _, _ in READING_RANGES], dtype=float)
+            self._hi = np.array([hi for _, _, hi, _ in READING_RANGES], dtype=float)
+            self._scale = np.array([10.0 ** places for _, _, _, places in READING_RANGES])
+            self._adjusted = np.array([READING_KEYS.index(name) for name, *_ in DIURNAL_ADJUSTMENTS])
+            self._day_lo, self._day_hi, self._night_lo, self._night_hi = (
+                np.array(column, dtype=float) for column in list(zip(*DIURNAL_ADJUSTMENTS))[1:]
+            )
+            self._min = np.array([READING_BOUNDS.get(name, (-np.inf, np.inf))[0] for name in READING_KEYS])
+            self._max = np.array([READING_BOUNDS.get(name, (-np.inf, np.inf))[1] for name in READING_KEYS])
+        
+        # Pond id derived from client_id (e.g., "pond_001_sensor" -> "pond_001")
+        self.pond_id = client_id.replace("_sensor", "").replace("device_", "pond_")
+        self.data_topic = f"farm1/{self.pond_id}/data"  # Legacy format your backend expects
+        
+        # Fields that never change between readings are encoded once and reused
+        self._static_fields = {
+            "pond_id": self.pond_id,
+            "device_id": client_id,
+            "location": {
+                "latitude": round(random.uniform(34.0, 35.0), 6),  # Example coordinates
+                "longitude": round(random.uniform(-118.5, -117.5), 6)
+            },
+            "sensor_status": "operational",
+            "calibration_date": "2025-01-15T08:00:00Z",
+            "data_quality": "good"  # good, fair, poor
+        }
+        if self.payload_format == "msgpack":
+            self._static_encoded = _msgpack_map_body(self._static_fields)
+        else:
+            self._static_encoded = _json_dumps(self._static_fields)[:-1]  # open object
+        
     def on_connect(self, client, userdata, flags, reason_code, properties=None):
         """Callback when client connects to broker (VERSION2 compatible)"""
         if reason_code == 0 or str(reason_code) == "Success":
-            print(f"✅ Connected to MQTT broker at {self.broker_host}:{self.broker_port}")
+            logger.info("✅ Connected to MQTT broker at %s:%s", self.broker_host, self.broker_port)
             self.is_connected = True
             # Subscribe to topics upon successful connection
             self.subscribe_to_topics()
         else:
-            print(f"❌ Failed to connect to MQTT broker. Reason code: {reason_code}")
+            logger.error("❌ Failed to connect to MQTT broker. Reason code: %s", reason_code)
             self.is_connected = False
     
     def on_message(self, client, userdata, msg):
         """Callback when a message is received"""
         try:
             topic = msg.topic
-            payload = msg.payload.decode('utf-8')
-            print(f"📨 Received message on topic '{topic}': {payload}")
+            payload = self.decode_payload(msg.payload)
+            logger.debug("📨 Received message on topic '%s': %s", topic, payload)
             
             # Handle different message types
-            if topic == "sensors/temperature":
-                self.handle_temperature_data(payload)
-            elif topic == "commands/device":
-                self.handle_device_command(payload)
-            elif topic == "status/heartbeat":
-                self.handle_heartbeat(payload)
+            handler = self._handlers.get(topic)
+            if handler is not None:
+                handler(payload)
                 
         except Exception as e:
-            print(f"❌ Error processing message: {e}")
+            logger.error("❌ Error processing message: %s", e)
+    
+    @staticmethod
+    def decode_payload(raw):
+        """MessagePack payloads become dicts; JSON and plain text stay bytes for the handlers"""
+        if raw and raw[0] not in JSON_PAYLOAD_PREFIXES and MSGPACK_AVAILABLE:
+            try:
+                data = msgpack.unpackb(raw, raw=False)
+                if isinstance(data, dict):
+                    return data
+            except ValueError:
+                pass
+        return raw  # orjson/json parse bytes directly, no decode copy needed
+    
+    @staticmethod
+    def payload_text(payload):
+        """Printable form of a decoded payload"""
+        return payload.decode('utf-8', 'replace') if isinstance(payload, bytes) else payload
     
     def on_disconnect(self, client, userdata, reason_code, properties=None):
         """Callback when client disconnects (VERSION2 compatible)"""
-        print(f"🔌 Disconnected from MQTT broker. Reason code: {reason_code}")
+        logger.warning("🔌 Disconnected from MQTT broker. Reason code: %s", reason_code)
         self.is_connected = False
     
-    def on_publish(self, client, userdata, mid, reason_code=None, properties=None):
-        """Callback when message is published (VERSION2 compatible)"""
-        print(f"📤 Message published successfully (ID: {mid})")
-    
     def connect(self):
         """Connect to MQTT broker"""
         try:
-            print(f"🔄 Connecting to MQTT broker at {self.broker_host}:{self.broker_port}...")
+            logger.info("🔄 Connecting to MQTT broker at %s:%s...", self.broker_host, self.broker_port)
             self.client.connect(self.broker_host, self.broker_port, 60)
             self.client.loop_start()  # Start network loop in background thread
             return True
         except Exception as e:
-            print(f"❌ Connection failed: {e}")
+            logger.error("❌ Connection failed: %s", e)
             return False
     
     def disconnect(self):
@@ -101,44 +270,70 @@ class MQTTConnection:
         
         for topic, qos in topics:
             self.client.subscribe(topic, qos)
-            print(f"🔔 Subscribed to topic: {topic}")
+            logger.info("🔔 Subscribed to topic: %s", topic)
+    
+    def encode_payload(self, payload):
+        """Encode dict payloads in the configured wire format"""
+        if isinstance(payload, dict):
+            if self.payload_format == "msgpack":
+                return msgpack.packb(payload, use_bin_type=True)
+            return _json_dumps(payload)
+        return payload
     
     def publish_message(self, topic, payload, qos=0):
         """Publish a message to a topic"""
+        return self.publish_batch([(topic, payload)], qos)
+    
+    def publish_batch(self, messages, qos=0):
+        """Queue (topic, payload) messages back-to-back for the network loop to send together
+        
+        Nothing waits on individual publishes: at QoS 0 there is no ack, so the
+        loop thread can flush everything queued here in one pass.
+        """
         if not self.is_connected:
-            print("❌ Not connected to broker. Cannot publish message.")
+            logger.warning("❌ Not connected to broker. Cannot publish message.")
             return False
         
         try:
-            # Convert payload to JSON if it's a dict
-            if isinstance(payload, dict):
-                payload = json.dumps(payload)
-            
-            result = self.client.publish(topic, payload, qos)
-            if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                print(f"📤 Published to '{topic}': {payload}")
-                return True
-            else:
-                print(f"❌ Failed to publish message. Error code: {result.rc}")
-                return False
+            debug = logger.isEnabledFor(logging.DEBUG)
+            # PUBLISH packets still go through paho: its loop thread writes PINGREQs and
+            # partial packets on the same socket, so frames written around it could interleave
+            publish = self.client.publish
+            for topic, payload in messages:
+                payload = self.encode_payload(payload)
+                result = publish(topic, payload, qos)
+                if result.rc != mqtt.MQTT_ERR_SUCCESS:
+                    logger.error("❌ Failed to publish message. Error code: %s", result.rc)
+                    return False
+                if debug:
+                    logger.debug("📤 Published to '%s': %s", topic, payload)
+            return True
         except Exception as e:
-            print(f"❌ Error publishing message: {e}")
+            logger.error("❌ Error publishing message: %s", e)
             return False
     
+    def encode_reading(self, dynamic):
+        """Splice freshly encoded changing fields onto the cached static ones"""
+        if self.payload_format == "msgpack":
+            count = len(self._static_fields) + len(dynamic)
+            header = bytes((0x80 | count,)) if count < 16 else b'\xde' + struct.pack('>H', count)
+            return header + self._static_encoded + _msgpack_map_body(dynamic)
+        return self._static_encoded + b',' + _json_dumps(dynamic)[1:]
+    
     def handle_temperature_data(self, payload):
         """Handle temperature sensor data"""
         try:
-            data = json.loads(payload)
+            data = payload if isinstance(payload, dict) else _json_loads(payload)
             temp = data.get('temperature', 'N/A')
             timestamp = data.get('timestamp', time.time())
             print(f"🌡️ Temperature reading: {temp}°C at {timestamp}")
         except:
-            print(f"🌡️ Temperature: {payload}")
+            print(f"🌡️ Temperature: {self.payload_text(payload)}")
     
     def handle_device_command(self, payload):
         """Handle device commands"""
         try:
-            command = json.loads(payload)
+            command = payload if isinstance(payload, dict) else _json_loads(payload)
             cmd_type = command.get('command', '')
             
             if cmd_type == 'reboot':
@@ -150,11 +345,11 @@ class MQTTConnection:
             else:
                 print(f"❓ Unknown command: {cmd_type}")
         except:
-            print(f"📋 Command: {payload}")
+            print(f"📋 Command: {self.payload_text(payload)}")
     
     def handle_heartbeat(self, payload):
         """Handle heartbeat messages"""
-        print(f"💓 Heartbeat from another device: {payload}")
+        print(f"💓 Heartbeat from another device: {self.payload_text(payload)}")
     
     def send_status_update(self):
         """Send device status update"""
@@ -166,99 +361,196 @@ class MQTTConnection:
         }
         self.publish_message("status/device", status)
     
+    def random_readings(self, daytime):
+        """Draw one rounded value per READING_RANGES field, adjusted for time of day and bounded"""
+        if NUMPY_AVAILABLE:
+            values = np.round(self._rng.uniform(self._lo, self._hi) * self._scale) / self._scale
+            if daytime:
+                values[self._adjusted] += self._rng.uniform(self._day_lo, self._day_hi)
+            else:
+                values[self._adjusted] += self._rng.uniform(self._night_lo, self._night_hi)
+            np.clip(values, self._min, self._max, out=values)
+            readings = dict(zip(READING_KEYS, values.tolist()))
+            readings["measurement_count"] = int(self._rng.integers(1, 11))  # number of readings averaged
+            return readings
+        readings = {name: round(random.uniform(lo, hi), places)
+                    for name, lo, hi, places in READING_RANGES}
+        for name, day_lo, day_hi, night_lo, night_hi in DIURNAL_ADJUSTMENTS:
+            readings[name] += random.uniform(day_lo, day_hi) if daytime else random.uniform(night_lo, night_hi)
+        for name, (low, high) in READING_BOUNDS.items():
+            readings[name] = max(low, min(high, readings[name]))
+        readings["measurement_count"] = random.randint(1, 10)  # number of readings averaged
+        return readings
+    
     def send_sensor_data(self):
         """Simulate sending comprehensive pond sensor data"""
-        # Get current time in ISO format
-        current_time = datetime.utcnow().isoformat() + 'Z'
+        # Read the clock once and share it between the reading and the heartbeat
+        now_ns = time.time_ns()
+        current_time = iso_timestamp(now_ns)
         
-        # Extract pond_id from client_id (e.g., "pond_001_sensor" -> "pond_001")
-        pond_id = self.client_id.replace("_sensor", "").replace("device_", "pond_")
+        pond_id = self.pond_id
         
-        # Generate realistic pond water quality data
-        pond_data = {
-            "pond_id": pond_id,
-            "device_id": self.client_id,
-            "timestamp": current_time,
-            "location": {
-                "latitude": round(random.uniform(34.0, 35.0), 6),  # Example coordinates
-                "longitude": round(random.uniform(-118.5, -117.5), 6)
-            },
-            # Water quality parameters with realistic ranges
-            "temperature": round(random.uniform(18.0, 28.0), 2),  # °C - typical fish pond range
-            "ph": round(random.uniform(6.5, 8.5), 2),  # pH - optimal fish range
-            "dissolved_oxygen": round(random.uniform(5.0, 12.0), 2),  # mg/L - critical for fish
-            "turbidity": round(random.uniform(0.5, 25.0), 2),  # NTU - water clarity
-            "ammonia": round(random.uniform(0.0, 0.5), 3),  # mg/L - toxic to fish
-            "nitrite": round(random.uniform(0.0, 0.3), 3),  # mg/L - toxic intermediate
-            "nitrate": round(random.uniform(0.0, 40.0), 2),  # mg/L - end product
-            "salinity": round(random.uniform(0.0, 5.0), 2),  # ppt - for brackish ponds
-            "water_level": round(random.uniform(0.8, 2.5), 2),  # meters - pond depth
-            
-            # Additional environmental data
-            "ambient_temperature": round(random.uniform(15.0, 35.0), 2),  # °C
-            "humidity": round(random.uniform(40.0, 85.0), 2),  # %
-            "light_intensity": round(random.uniform(0, 100000), 0),  # lux
-            
-            # System status
-            "battery_level": round(random.uniform(20.0, 100.0), 1),  # %
-            "signal_strength": round(random.uniform(-90, -30), 0),  # dBm
-            "sensor_status": "operational",
-            "calibration_date": "2025-01-15T08:00:00Z",
-            
-            # Data quality indicators
-            "data_quality": "good",  # good, fair, poor
-            "sensor_drift": round(random.uniform(0.0, 5.0), 2),  # %
-            "measurement_count": random.randint(1, 10)  # number of readings averaged
-        }
-        
-        # Add some realistic variations based on time of day
-        hour = datetime.utcnow().hour
-        if 6 <= hour <= 18:  # Daytime
-            pond_data["dissolved_oxygen"] += random.uniform(0.5, 1.5)  # Higher O2 during day
-            pond_data["temperature"] += random.uniform(1.0, 3.0)  # Warmer during day
-        else:  # Nighttime
-            pond_data["dissolved_oxygen"] -= random.uniform(0.2, 0.8)  # Lower O2 at night
-            pond_data["temperature"] -= random.uniform(0.5, 2.0)  # Cooler at night
+        # Generate realistic pond water quality data; static fields are added when encoding
+        hour = now_ns // NS_PER_HOUR % 24
+        pond_data = {"timestamp": current_time}
+        pond_data.update(self.random_readings(6 <= hour <= 18))  # Daytime from 06:00 to 18:59
         
-        # Ensure values stay within realistic bounds
-        pond_data["dissolved_oxygen"] = max(0.0, min(15.0, pond_data["dissolved_oxygen"]))
-        pond_data["temperature"] = max(0.0, min(40.0, pond_data["temperature"]))
+        # Encoded once, published to both topics
+        payload = self.encode_reading(pond_data)
         
-        # Send to the topic that matches your backend expectations
-        topic = f"farm1/{pond_id}/data"  # Legacy format your backend expects
-        self.publish_message(topic, pond_data)
-        
-        # Also send to new sensor topic format
-        self.publish_message("sensors/water_quality", pond_data)
-        
-        # Send heartbeat with more details
+        # Heartbeat with more details
         heartbeat = {
             "device_id": self.client_id,
             "pond_id": pond_id,
             "timestamp": current_time,
             "status": "alive",
-            "uptime": round(time.time() - self.start_time, 2),  # seconds since start
+            "uptime": round(now_ns / 1e9 - self.start_time, 2),  # seconds since start
             "memory_usage": round(random.uniform(30.0, 80.0), 1),  # %
             "cpu_usage": round(random.uniform(5.0, 40.0), 1),  # %
             "network_quality": random.choice(["excellent", "good", "fair", "poor"]),
             "last_maintenance": "2025-01-10T14:30:00Z"
         }
-        self.publish_message("status/heartbeat", heartbeat)
+        
+        self.publish_batch([
+            # The topic that matches your backend expectations
+            (self.data_topic, payload),
+            # Also the new sensor topic format
+            ("sensors/water_quality", payload),
+            ("status/heartbeat", heartbeat),
+        ])
+
+
+class AsyncioSocketDriver:
+    """Drives a paho client's socket from an asyncio loop instead of a loop_start() thread"""
+    
+    def __init__(self, loop, client):
+        self.loop = loop
+        self.client = client
+        self.misc = None
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+    
+    def on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        self.misc = self.loop.create_task(self.misc_loop())
+    
+    def on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        if self.misc is not None:
+            self.misc.cancel()
+    
+    def on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+    
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+    
+    async def misc_loop(self):
+        """Keep-alive pings and timeout checks, once a second like paho's own loop"""
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+
+class MQTTConnectionPool:
+    """Several simulated devices publishing over one shared MQTT connection
+    
+    The connection is driven from the running asyncio loop, so the pool must be
+    connected from inside a coroutine; each device runs as its own coroutine.
+    """
+    
+    def __init__(self, broker_host, broker_port, client_id, device_ids, payload_format="json"):
+        self.broker_host = broker_host
+        self.broker_port = broker_port
+        self.client = create_client(client_id)
+        self.devices = [
+            MQTTConnection(broker_host, broker_port, device_id, payload_format, client=self.client)
+            for device_id in device_ids
+        ]
+        self.is_connected = False
+        self._driver = None
+        
+        # One subscription per connection, so incoming messages are handled once
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.devices[0].on_message
+        self.client.on_disconnect = self.on_disconnect
+    
+    def _set_connected(self, connected):
+        self.is_connected = connected
+        for device in self.devices:
+            device.is_connected = connected
+    
+    def on_connect(self, client, userdata, flags, reason_code, properties=None):
+        """Callback when the shared client connects to broker (VERSION2 compatible)"""
+        if reason_code == 0 or str(reason_code) == "Success":
+            logger.info("✅ Connected to MQTT broker at %s:%s for %d device(s)",
+                        self.broker_host, self.broker_port, len(self.devices))
+            self._set_connected(True)
+            self.devices[0].subscribe_to_topics()
+        else:
+            logger.error("❌ Failed to connect to MQTT broker. Reason code: %s", reason_code)
+            self._set_connected(False)
+    
+    def on_disconnect(self, client, userdata, reason_code, properties=None):
+        """Callback when the shared client disconnects (VERSION2 compatible)"""
+        logger.warning("🔌 Disconnected from MQTT broker. Reason code: %s", reason_code)
+        self._set_connected(False)
+    
+    def connect(self):
+        """Connect the shared client to the MQTT broker from the running event loop"""
+        if self._driver is None:
+            self._driver = AsyncioSocketDriver(asyncio.get_running_loop(), self.client)
+        try:
+            logger.info("🔄 Connecting to MQTT broker at %s:%s...", self.broker_host, self.broker_port)
+            self.client.connect(self.broker_host, self.broker_port, 60)
+            return True
+        except Exception as e:
+            logger.error("❌ Connection failed: %s", e)
+            return False
+    
+    def disconnect(self):
+        """Disconnect the shared client"""
+        self.client.disconnect()
+    
+    def send_status_update(self):
+        """Send a status update for every device"""
+        for device in self.devices:
+            device.send_status_update()
+    
+    async def run_device(self, device, interval):
+        """Publish one device's sensor data every interval seconds"""
+        while True:
+            if device.is_connected:
+                device.send_sensor_data()
+            await asyncio.sleep(interval)
+    
+    async def run(self, interval):
+        """Run every device on this event loop until cancelled"""
+        await asyncio.gather(*(self.run_device(device, interval) for device in self.devices))
 
-def main():
+async def main():
     # Configuration - Try public broker first for testing
     BROKER_HOST = "broker.hivemq.com"  # Public broker for testing
     # Alternative: "test.mosquitto.org" or your local IP if broker is running
     BROKER_PORT = 1883
     CLIENT_ID = "pond_001_sensor"  # More realistic pond sensor ID
+    DEVICE_IDS = [CLIENT_ID]  # Add more ids (e.g. "pond_002_sensor") to simulate them over the same connection
+    PAYLOAD_FORMAT = "json"  # or "msgpack" for smaller payloads when every subscriber understands it
+    PUBLISH_INTERVAL = 5  # seconds between readings per device
+    LOG_LEVEL = logging.INFO  # logging.DEBUG also logs every published and received message
+    
+    logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s - %(levelname)s - %(message)s')
     
     print("🔧 MQTT Configuration:")
     print(f"   Broker: {BROKER_HOST}:{BROKER_PORT}")
     print(f"   Client ID: {CLIENT_ID}")
+    print(f"   Devices: {', '.join(DEVICE_IDS)}")
+    print(f"   Payload format: {PAYLOAD_FORMAT}")
     print()
     
-    # Create MQTT connection
-    mqtt_conn = MQTTConnection(BROKER_HOST, BROKER_PORT, CLIENT_ID)
+    # Create one MQTT connection shared by all simulated devices
+    mqtt_conn = MQTTConnectionPool(BROKER_HOST, BROKER_PORT, CLIENT_ID, DEVICE_IDS, PAYLOAD_FORMAT)
     
     # Connect to broker
     if not mqtt_conn.connect():
@@ -271,33 +563,42 @@ def main():
         return
     
     # Wait for connection to establish
-    time.sleep(2)
+    await asyncio.sleep(2)
     
+    devices = None
     try:
         # Send initial status
         mqtt_conn.send_status_update()
         
         # Start periodic sensor data transmission
         print("🚀 Starting sensor data transmission...")
-        print("📝 Publishing sensor data every 5 seconds...")
+        print(f"📝 Publishing sensor data every {PUBLISH_INTERVAL} seconds...")
         print("🛑 Press Ctrl+C to stop")
         
+        devices = asyncio.create_task(mqtt_conn.run(PUBLISH_INTERVAL))
         while True:
-            if mqtt_conn.is_connected:
-                mqtt_conn.send_sensor_data()
-            else:
+            await asyncio.sleep(PUBLISH_INTERVAL)
+            if devices.done():
+                devices.result()  # Surface the error that stopped the devices
+            if not mqtt_conn.is_connected:
                 print("⚠️ Connection lost. Attempting to reconnect...")
                 mqtt_conn.connect()
             
-            time.sleep(5)  # Send data every 5 seconds
-            
-    except KeyboardInterrupt:
+    except asyncio.CancelledError:
         print("\n🛑 Stopping MQTT client...")
+        raise
     except Exception as e:
         print(f"❌ Error in main loop: {e}")
     finally:
+        if devices is not None:
+            devices.cancel()
         mqtt_conn.disconnect()
         print("👋 MQTT client disconnected")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if UVLOOP_AVAILABLE:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass  # Ctrl+C; main() has already disconnected
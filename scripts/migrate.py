@@ -6,7 +6,13 @@ This script handles database migrations and updates.
 """
 
 import asyncio
-from app.database.connection import connect_to_mongo, get_database, close_mongo_connection
+from app.config import get_settings
+from app.database.connection import (
+    connect_to_mongo, get_database, close_mongo_connection, SENSOR_READINGS_TIMESERIES
+)
+
+# $out into a time-series collection needs at least this MongoDB server version
+TIMESERIES_OUT_MIN_VERSION = (7, 0, 3)
 
 
 async def migrate_v1_to_v2():
@@ -28,6 +34,65 @@ async def migrate_v1_to_v2():
     print("Migration v1 to v2 completed")
 
 
+async def migrate_sensor_readings_to_timeseries():
+    """
+    Convert sensor_readings into a time-series collection.
+
+    Requires MongoDB 7.0.3+ ($out into a time-series collection). String
+    timestamps are converted to dates; readings whose timestamp is missing or
+    unparseable cannot go into a time-series collection and are reported.
+    The original documents are kept in sensor_readings_legacy.
+    """
+    print("Running sensor_readings time-series migration...")
+    
+    db = get_database()
+    
+    cursor = await db.list_collections(filter={"name": "sensor_readings"})
+    collections = await cursor.to_list(length=None)
+    if collections and collections[0].get("type") == "timeseries":
+        print("sensor_readings is already a time-series collection")
+        return
+    if not collections:
+        await db.create_collection("sensor_readings", timeseries=SENSOR_READINGS_TIMESERIES)
+        print("Created time-series collection sensor_readings")
+        return
+    
+    build_info = await db.command("buildInfo")
+    server_version = tuple(build_info["versionArray"][:3])
+    if server_version < TIMESERIES_OUT_MIN_VERSION:
+        print(f"Skipping time-series migration: MongoDB {build_info['version']} is older than "
+              f"{'.'.join(map(str, TIMESERIES_OUT_MIN_VERSION))}, which $out into a time-series collection needs")
+        return
+    
+    # Time-series collections cannot be renamed, so move the old data aside
+    # and rebuild sensor_readings from it with $out
+    await db.sensor_readings.rename("sensor_readings_legacy")
+    await db.sensor_readings_legacy.aggregate([
+        # Older writers stored ISO strings; convert them instead of dropping the readings
+        {"$set": {"timestamp": {"$cond": [
+            {"$eq": [{"$type": "$timestamp"}, "string"]},
+            {"$dateFromString": {"dateString": "$timestamp", "onError": None, "onNull": None}},
+            "$timestamp"
+        ]}}},
+        {"$match": {"timestamp": {"$type": "date"}}},
+        {"$out": {
+            "db": get_settings().database_name,
+            "coll": "sensor_readings",
+            "timeseries": SENSOR_READINGS_TIMESERIES
+        }}
+    ]).to_list(length=None)
+    
+    await db.sensor_readings.create_index([("pond_id", 1), ("timestamp", -1)])
+    await db.sensor_readings.create_index("is_anomaly")
+    
+    total = await db.sensor_readings_legacy.count_documents({})
+    migrated = await db.sensor_readings.count_documents({})
+    if total > migrated:
+        print(f"⚠️ Skipped {total - migrated} of {total} readings with a missing or unparseable timestamp")
+    
+    print("Migration to time-series completed (old data kept in sensor_readings_legacy)")
+
+
 async def main():
     """Main migration function"""
     print("🔄 Database Migration Tool")
@@ -37,6 +102,7 @@ async def main():
     
     # Run migrations
     await migrate_v1_to_v2()
+    await migrate_sensor_readings_to_timeseries()
     
     await close_mongo_connection()
     
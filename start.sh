@@ -32,7 +32,8 @@ mkdir -p models
 # Function to start services
 start_api() {
     echo "🚀 Starting API server with integrated MQTT subscriber..."
-    uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload &
+    uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload \
+        --ws-per-message-deflate ${WEBSOCKET_PER_MESSAGE_DEFLATE:-true} --ws-ping-interval ${WEBSOCKET_PING_INTERVAL:-15} --ws-ping-timeout ${WEBSOCKET_PING_TIMEOUT:-20} &
     API_PID=$!
     echo "API server started with PID: $API_PID"
     echo "📡 MQTT subscriber will start automatically as a background service"
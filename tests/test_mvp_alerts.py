@@ -0,0 +1,91 @@
+"""
+Tests for the MVP dashboard alert endpoints
+"""
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import mvp_dashboard
+from app.auth.auth import get_current_user
+from app.database.connection import get_database
+from app.utils.mongo_serializer import ORJSONResponse
+
+
+class FakeCursor:
+    """Just enough of a Motor cursor for find().sort().to_list()"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    async def to_list(self, length=None):
+        return [dict(doc) for doc in self.docs[:length]]
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query=None):
+        query = query or {}
+        return FakeCursor([
+            doc for doc in self.docs
+            if all(doc.get(key) == value for key, value in query.items())
+        ])
+
+
+class FakeDatabase:
+    def __init__(self, alerts):
+        self.alerts = FakeCollection(alerts)
+
+
+def make_client(alerts):
+    """App with only the MVP router, backed by an in-memory alerts collection"""
+    app = FastAPI(default_response_class=ORJSONResponse)
+    app.include_router(mvp_dashboard.router)
+    app.dependency_overrides[get_database] = lambda: FakeDatabase(alerts)
+    app.dependency_overrides[get_current_user] = lambda: {"username": "tester"}
+    return TestClient(app)
+
+
+def test_active_alerts_serializes_object_ids():
+    alert_id = ObjectId()
+    reading_id = ObjectId()
+    created_at = datetime(2025, 1, 15, 8, 30)
+    client = make_client([
+        {
+            "_id": alert_id,
+            "pond_id": "pond_001",
+            "sensor_reading_id": reading_id,
+            "alert_type": "threshold_exceeded",
+            "severity": "high",
+            "parameter": "ph",
+            "current_value": 9.1,
+            "message": "pH above range",
+            "is_resolved": False,
+            "created_at": created_at,
+        },
+        {
+            "_id": ObjectId(),
+            "pond_id": "pond_001",
+            "severity": "low",
+            "is_resolved": True,
+            "created_at": created_at,
+        },
+    ])
+
+    response = client.get("/mvp/alerts/active")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total_active_alerts"] == 1
+    assert body["by_severity"]["high"] == 1
+    alert = body["alerts"][0]
+    assert alert["id"] == str(alert_id)
+    assert "_id" not in alert
+    assert alert["sensor_reading_id"] == str(reading_id)
+    assert alert["created_at"] == "2025-01-15T08:30:00+00:00"